@@ -78,3 +78,201 @@ class Label2Mask(SimpleInterface):
 
         self._results["out_file"] = out_file
         return runtime
+
+
+class MakeRibbonInputSpec(TraitedSpec):
+    white_distvols = traits.List(
+        File(exists=True), minlen=2, maxlen=2, mandatory=True,
+        desc="Signed distance volumes of the white surfaces (left, right)")
+    pial_distvols = traits.List(
+        File(exists=True), minlen=2, maxlen=2, mandatory=True,
+        desc="Signed distance volumes of the pial surfaces (left, right)")
+
+
+class MakeRibbonOutputSpec(TraitedSpec):
+    ribbon = File(desc="Binary cortical ribbon mask")
+
+
+class MakeRibbon(SimpleInterface):
+    """ Create a binary cortical ribbon mask from surface signed distance volumes
+
+    A voxel is included in the ribbon if it lies outside the white surface and
+    inside the pial surface of either hemisphere.
+    """
+    input_spec = MakeRibbonInputSpec
+    output_spec = MakeRibbonOutputSpec
+
+    def _run_interface(self, runtime):
+        self._results["ribbon"] = _make_ribbon(
+            self.inputs.white_distvols,
+            self.inputs.pial_distvols,
+            newpath=runtime.cwd,
+        )
+        return runtime
+
+
+def _make_ribbon(white_distvols, pial_distvols, newpath=None):
+    import nibabel as nb
+
+    base_img = nb.load(white_distvols[0])
+    header = base_img.header.copy()
+    header.set_data_dtype(np.uint8)
+
+    # Boolean (one byte per voxel) buffers, combined in place, and reinterpreted
+    # as uint8 for writing without a copy
+    ribbon = np.zeros(base_img.shape[:3], dtype=bool)
+    outside_white = np.empty_like(ribbon)
+    inside_pial = np.empty_like(ribbon)
+    for white, pial in zip(white_distvols, pial_distvols):
+        np.greater(np.asanyarray(nb.load(white).dataobj), 0, out=outside_white)
+        np.less(np.asanyarray(nb.load(pial).dataobj), 0, out=inside_pial)
+        np.bitwise_and(outside_white, inside_pial, out=outside_white)
+        np.bitwise_or(ribbon, outside_white, out=ribbon)
+
+    out_file = os.path.join(newpath or os.getcwd(), "ribbon.nii")
+    base_img.__class__(ribbon.view(np.uint8), base_img.affine, header).to_filename(out_file)
+    return out_file
+
+
+class CovModulateInputSpec(TraitedSpec):
+    in_file = File(exists=True, mandatory=True, desc="BOLD series")
+    mask_file = File(exists=True, mandatory=True,
+                     desc="Cortical ribbon mask, on the same grid as the BOLD series")
+    sigma = traits.Float(5.0, usedefault=True,
+                         desc="Standard deviation (in mm) of the Gaussian smoothing kernel")
+    chunk_size = traits.Int(32, usedefault=True,
+                            desc="Number of frames read from the BOLD series at a time")
+
+
+class CovModulateOutputSpec(TraitedSpec):
+    out_file = File(desc="Modulated, normalized coefficient of variation")
+    ribbon_mean = traits.Float(desc="Mean of the modulated CoV within the ribbon")
+    ribbon_std = traits.Float(desc="Standard deviation of the modulated CoV within the ribbon")
+    mean_file = File(desc="Temporal mean of the BOLD series")
+
+
+class CovModulate(SimpleInterface):
+    """ Calculate the modulated coefficient of variation (CoV) of a BOLD series
+
+    Follows the "goodvoxels" procedure of the HCP Pipelines: the temporal CoV is
+    normalized by its mean within the cortical ribbon, and then modulated by
+    (divided by) the normalized CoV of the ribbon after smoothing, so that voxels
+    with a locally high CoV stand out.
+    Divisions by zero yield zero, as in ``fslmaths``.
+    The mean and standard deviation of the modulated CoV over the (nonzero)
+    ribbon voxels are also reported, as ``fslstats -M`` and ``-S`` would.
+    The temporal mean of the series, computed in the same pass as the standard
+    deviation, is written out as well.
+    """
+    input_spec = CovModulateInputSpec
+    output_spec = CovModulateOutputSpec
+
+    def _run_interface(self, runtime):
+        import nibabel as nb
+        from scipy.ndimage import gaussian_filter
+
+        # Stream the series in blocks of frames, merging the per-block means and
+        # sums of squared deviations (Chan et al.), so that the whole series is
+        # never resident in memory
+        img = nb.load(self.inputs.in_file, mmap=True, keep_file_open=True)
+        n_frames = img.shape[3]
+        count, mean, m2 = 0, np.zeros(img.shape[:3]), np.zeros(img.shape[:3])
+        for start in range(0, n_frames, self.inputs.chunk_size):
+            block = np.asarray(
+                img.dataobj[..., start:start + self.inputs.chunk_size], dtype=np.float32
+            )
+            block_count = block.shape[-1]
+            block_mean = block.mean(axis=-1, dtype=np.float64)
+            block_m2 = np.square(block - block_mean[..., np.newaxis].astype(np.float32)).sum(
+                axis=-1, dtype=np.float64
+            )
+            delta = block_mean - mean
+            total = count + block_count
+            mean += delta * (block_count / total)
+            m2 += block_m2 + np.square(delta) * (count * block_count / total)
+            count = total
+        del block
+        mean = mean.astype(np.float32)
+        cov = _safe_div(np.sqrt(m2 / (count - 1)).astype(np.float32), mean)
+
+        ribbon = np.asanyarray(nb.load(self.inputs.mask_file).dataobj) > 0
+        cov_ribbon = np.where(ribbon, cov, 0)
+        cov_ribbon_mean = cov_ribbon[cov_ribbon != 0].mean()
+        cov_ribbon_norm = cov_ribbon / cov_ribbon_mean
+
+        sigma = self.inputs.sigma / np.array(img.header.get_zooms()[:3])
+        smooth_norm = gaussian_filter(
+            (cov_ribbon_norm != 0).astype(np.float32), sigma, mode="constant"
+        )
+        cov_ribbon_norm_smooth = _safe_div(
+            gaussian_filter(cov_ribbon_norm, sigma, mode="constant"), smooth_norm
+        )
+        modulated = _safe_div(cov / cov_ribbon_mean, cov_ribbon_norm_smooth)
+
+        modulated_ribbon = modulated[ribbon]
+        modulated_ribbon = modulated_ribbon[modulated_ribbon != 0]
+        self._results["ribbon_mean"] = float(modulated_ribbon.mean(dtype=np.float64))
+        self._results["ribbon_std"] = float(modulated_ribbon.std(dtype=np.float64, ddof=1))
+
+        header = img.header.copy()
+        header.set_data_dtype(np.float32)
+        # Intermediate volumes: skip the compression
+        for name, suffix, out_data in (
+            ("out_file", "_cov_modulated.nii", modulated),
+            ("mean_file", "_mean.nii", mean),
+        ):
+            out_file = fname_presuffix(
+                self.inputs.in_file, suffix=suffix, use_ext=False, newpath=runtime.cwd
+            )
+            img.__class__(out_data, img.affine, header).to_filename(out_file)
+            self._results[name] = out_file
+        return runtime
+
+
+class GoodVoxelsMaskInputSpec(TraitedSpec):
+    in_file = File(exists=True, mandatory=True,
+                   desc="Modulated, normalized coefficient of variation")
+    mean_file = File(exists=True, mandatory=True, desc="Temporal mean of the BOLD series")
+    mask_file = File(exists=True, mandatory=True,
+                     desc="Cortical ribbon mask, on the same grid as the BOLD series")
+    threshold = traits.Float(mandatory=True,
+                             desc="Voxels with a modulated CoV at or above this are excluded")
+
+
+class GoodVoxelsMaskOutputSpec(TraitedSpec):
+    out_file = File(desc="Goodvoxels mask, within the ribbon")
+
+
+class GoodVoxelsMask(SimpleInterface):
+    """ Calculate the "goodvoxels" mask from a modulated CoV map
+
+    Keeps the ribbon voxels with nonzero signal whose modulated CoV is below
+    ``threshold``, in one pass (equivalent to thresholding and binarizing with
+    ``fslmaths``, and masking with the ribbon).
+    """
+    input_spec = GoodVoxelsMaskInputSpec
+    output_spec = GoodVoxelsMaskOutputSpec
+
+    def _run_interface(self, runtime):
+        import nibabel as nb
+
+        img = nb.load(self.inputs.in_file)
+        cov = np.asanyarray(img.dataobj)
+        goodvoxels = (
+            (np.asanyarray(nb.load(self.inputs.mean_file).dataobj) != 0)
+            & (np.asanyarray(nb.load(self.inputs.mask_file).dataobj) > 0)
+            & ((cov < self.inputs.threshold) | (cov == 0))
+        )
+
+        header = img.header.copy()
+        header.set_data_dtype(np.uint8)
+        out_file = fname_presuffix(
+            self.inputs.in_file, suffix="_goodvoxels", newpath=runtime.cwd
+        )
+        img.__class__(goodvoxels.astype(np.uint8), img.affine, header).to_filename(out_file)
+        self._results["out_file"] = out_file
+        return runtime
+
+
+def _safe_div(num, den):
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
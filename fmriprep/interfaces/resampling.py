@@ -0,0 +1,277 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2022 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Resampling BOLD series in a single process."""
+import numpy as np
+import nibabel as nb
+from nipype.utils.filemanip import fname_presuffix
+from nipype.interfaces.base import (
+    traits, TraitedSpec, BaseInterfaceInputSpec, File, SimpleInterface,
+    InputMultiObject, OutputMultiObject, isdefined
+)
+
+
+class _ResampleSeriesInputSpec(BaseInterfaceInputSpec):
+    input_image = File(exists=True, mandatory=True, desc="Series (or single volume) to resample")
+    transforms = InputMultiObject(
+        traits.Either(File(exists=True), traits.Enum("identity")), mandatory=True,
+        desc="ITK transforms, in the order of antsApplyTransforms. "
+             "Files holding one transform per volume are applied volume-wise")
+    reference_image = File(exists=True, mandatory=True, desc="Reference grid")
+    header_source = File(exists=True, desc="Series to take the repetition time from")
+    order = traits.Range(0, 5, 3, usedefault=True, desc="Order of the spline interpolation")
+    clip = traits.Bool(True, usedefault=True,
+                       desc="Set negative values (interpolation artifacts) to zero")
+    copy_dtype = traits.Bool(False, usedefault=True,
+                             desc="Write the output with the data type of the inputs")
+    compress = traits.Bool(True, usedefault=True, desc="Write a compressed NIfTI file")
+    num_threads = traits.Int(1, usedefault=True, nohash=True,
+                             desc="Number of volumes resampled in parallel")
+
+
+class _ResampleSeriesOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="Resampled series")
+
+
+class ResampleSeries(SimpleInterface):
+    """
+    Resample the volumes of a series onto a reference grid.
+
+    Replaces :class:`niworkflows.interfaces.itk.MultiApplyTransforms` and the
+    splitting and concatenation of the series around it: all the transforms are
+    loaded once and the world coordinates of the reference grid are mapped once
+    through the transforms shared by all volumes, every volume is then read from
+    the input series and resampled in this process into a single 4D series.
+    Single volumes (3D images) are resampled into 3D images.
+
+    """
+
+    input_spec = _ResampleSeriesInputSpec
+    output_spec = _ResampleSeriesOutputSpec
+
+    def _run_interface(self, runtime):
+        from concurrent.futures import ThreadPoolExecutor
+        from fmriprep.utils.transforms import grid_points, load_transforms, map_points
+
+        chain = load_transforms(self.inputs.transforms)
+        ref = nb.load(self.inputs.reference_image)
+
+        # Compose the transforms shared by all volumes (e.g., normalization,
+        # coregistration and distortion correction) once, on the reference grid,
+        # so that only the volume-wise transforms (head-motion) are applied per volume
+        n_shared = next(
+            (i for i, xfm in enumerate(chain) if getattr(xfm, "ndim", 2) == 3), len(chain)
+        )
+        ref_points = map_points(chain[:n_shared], grid_points(ref))
+        chain = chain[n_shared:]
+
+        img = nb.load(self.inputs.input_image, mmap=True)
+        n_frames = img.shape[3] if img.ndim == 4 else 1
+        read_frame = _frame_reader(img, self.inputs.input_image.endswith(".gz"))
+        resampled = np.zeros(ref.shape[:3] + (n_frames,), dtype=np.float32)
+
+        def _resample(index):
+            mapped = map_points(chain, ref_points, index=index)
+            resampled[..., index] = _resample_volume(
+                read_frame(index), img.affine, mapped, self.inputs.order
+            ).reshape(ref.shape[:3])
+
+        # SciPy's interpolation releases the GIL, so volumes run concurrently in threads
+        with ThreadPoolExecutor(max_workers=self.inputs.num_threads) as executor:
+            list(executor.map(_resample, range(n_frames)))
+        if self.inputs.clip:
+            np.clip(resampled, 0, None, out=resampled)
+        if img.ndim == 3:
+            resampled = resampled[..., 0]
+
+        out_img = nb.Nifti1Image(resampled, ref.affine, ref.header)
+        out_img.set_data_dtype(img.get_data_dtype() if self.inputs.copy_dtype else np.float32)
+        if isdefined(self.inputs.header_source) and out_img.ndim == 4:
+            src_hdr = nb.load(self.inputs.header_source).header
+            out_img.header.set_xyzt_units(
+                xyz=ref.header.get_xyzt_units()[0], t=src_hdr.get_xyzt_units()[-1]
+            )
+            out_img.header.set_zooms(ref.header.get_zooms()[:3] + src_hdr.get_zooms()[3:4])
+
+        self._results["out_file"] = fname_presuffix(
+            self.inputs.input_image,
+            suffix="_resampled.nii.gz" if self.inputs.compress else "_resampled.nii",
+            use_ext=False,
+            newpath=runtime.cwd,
+        )
+        _write_nifti(out_img, self._results["out_file"], self.inputs.num_threads)
+        return runtime
+
+
+def _frame_reader(img, compressed):
+    """
+    Return a function reading the volumes of a series in single precision.
+
+    Uncompressed series are memory-mapped and only the requested volume is read,
+    while compressed series are decompressed once, in their on-disk data type.
+
+    """
+    dataobj = img.dataobj
+    if compressed and nb.is_proxy(dataobj):
+        slope, inter = np.float32(dataobj.slope), np.float32(dataobj.inter)
+        dataobj = dataobj.get_unscaled()
+    else:
+        slope, inter = np.float32(1.0), np.float32(0.0)
+
+    def read_frame(index):
+        frame = dataobj[..., index] if img.ndim == 4 else dataobj
+        return np.asanyarray(frame, dtype=np.float32) * slope + inter
+
+    return read_frame
+
+
+def _resample_volume(data, affine, points, order):
+    """Interpolate a 3D array at world coordinates."""
+    from scipy.ndimage import map_coordinates, spline_filter
+    from fmriprep.utils.transforms import apply_affine
+
+    ijk = apply_affine(np.linalg.inv(affine), points)
+    # Single precision throughout: SciPy would filter into a double buffer
+    if order > 1:
+        data = spline_filter(data, order, output=np.float32, mode="constant")
+    return map_coordinates(
+        data,
+        ijk.T,
+        output=np.float32,
+        order=order,
+        mode="constant",
+        cval=0.0,
+        prefilter=False,
+    )
+
+
+def _write_nifti(img, out_file, num_threads=1):
+    """Write a NIfTI file, compressing it in parallel with ``pigz`` when available."""
+    import shutil
+    import subprocess
+
+    pigz = shutil.which("pigz")
+    if not out_file.endswith(".gz") or pigz is None:
+        img.to_filename(out_file)
+        return
+
+    img.to_filename(out_file[:-3])
+    subprocess.run([pigz, "-f", "-1", "-p", str(num_threads), out_file[:-3]], check=True)
+
+
+class _ResampleLabelsInputSpec(BaseInterfaceInputSpec):
+    in_files = InputMultiObject(File(exists=True), mandatory=True,
+                                desc="Label images (e.g., segmentations) to resample")
+    transforms = InputMultiObject(
+        traits.Either(File(exists=True), traits.Enum("identity")), mandatory=True,
+        desc="ITK transforms, in the order of antsApplyTransforms")
+    reference_image = File(exists=True, mandatory=True, desc="Reference grid")
+
+
+class _ResampleLabelsOutputSpec(TraitedSpec):
+    out_files = OutputMultiObject(File(exists=True), desc="Resampled label images")
+
+
+class ResampleLabels(SimpleInterface):
+    """
+    Resample several label images with the same transforms, in a single process.
+
+    The reference grid is mapped through the transforms once, and every label
+    image is sampled at the nearest voxel, keeping its data type.
+
+    """
+
+    input_spec = _ResampleLabelsInputSpec
+    output_spec = _ResampleLabelsOutputSpec
+
+    def _run_interface(self, runtime):
+        from fmriprep.utils.transforms import (
+            apply_affine, grid_points, load_transforms, map_points
+        )
+
+        ref = nb.load(self.inputs.reference_image)
+        points = map_points(load_transforms(self.inputs.transforms), grid_points(ref))
+
+        self._results["out_files"] = []
+        voxels = {}
+        for in_file in self.inputs.in_files:
+            img = nb.load(in_file)
+            # Label images are typically defined on the same grid (e.g., aseg and aparc)
+            key = (img.shape[:3], img.affine.tobytes())
+            if key not in voxels:
+                ijk = np.rint(apply_affine(np.linalg.inv(img.affine), points)).astype(int)
+                inside = np.all((ijk >= 0) & (ijk < img.shape[:3]), axis=1)
+                voxels[key] = (tuple(ijk[inside].T), inside)
+            ijk, inside = voxels[key]
+
+            data = np.asanyarray(img.dataobj)
+            resampled = np.zeros(inside.shape, dtype=data.dtype)
+            resampled[inside] = data[ijk]
+
+            out_img = nb.Nifti1Image(resampled.reshape(ref.shape[:3]), ref.affine, ref.header)
+            out_img.set_data_dtype(data.dtype)
+            out_img.header.set_slope_inter(1.0, 0.0)
+            out_file = fname_presuffix(
+                in_file, suffix="_trans.nii.gz", use_ext=False, newpath=runtime.cwd
+            )
+            out_img.to_filename(out_file)
+            self._results["out_files"].append(out_file)
+        return runtime
+
+
+class _ComposeTransformsInputSpec(BaseInterfaceInputSpec):
+    transforms = InputMultiObject(
+        traits.Either(File(exists=True), traits.Enum("identity")), mandatory=True,
+        desc="ITK transforms, in the order of antsApplyTransforms")
+    reference_image = File(exists=True, mandatory=True, desc="Reference grid")
+
+
+class _ComposeTransformsOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="Displacements field, in ITK format")
+
+
+class ComposeTransforms(SimpleInterface):
+    """
+    Compose a chain of transforms into a displacements field on a reference grid.
+
+    Decoding a (possibly large) composite transform once, into a field that
+    resamplings onto the same grid read directly (uncompressed, so that it is
+    memory-mapped), spares decoding it again for each of them.
+
+    """
+
+    input_spec = _ComposeTransformsInputSpec
+    output_spec = _ComposeTransformsOutputSpec
+
+    def _run_interface(self, runtime):
+        from fmriprep.utils.transforms import load_transforms, to_displacements
+
+        self._results["out_file"] = fname_presuffix(
+            self.inputs.reference_image,
+            suffix="_field.nii",
+            use_ext=False,
+            newpath=runtime.cwd,
+        )
+        to_displacements(
+            load_transforms(self.inputs.transforms), nb.load(self.inputs.reference_image)
+        ).to_filename(self._results["out_file"])
+        return runtime
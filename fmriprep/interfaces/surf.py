@@ -0,0 +1,496 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2022 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Sampling volumetric data onto surfaces, and resampling surface data."""
+import os
+from functools import lru_cache
+
+import numpy as np
+import nibabel as nb
+from nipype.utils.filemanip import fname_presuffix
+from nipype.interfaces.base import (
+    traits, TraitedSpec, BaseInterfaceInputSpec, File, Directory,
+    SimpleInterface, OutputMultiObject, isdefined
+)
+
+_STRUCTURES = {"lh": "CortexLeft", "rh": "CortexRight"}
+
+
+class _VolumeToSurfaceInputSpec(BaseInterfaceInputSpec):
+    in_file = File(exists=True, mandatory=True,
+                   desc="BOLD series, aligned with the surfaces")
+    white_surfs = traits.List(File(exists=True), minlen=2, maxlen=2, mandatory=True,
+                              desc="GIFTI white surfaces (left, right)")
+    pial_surfs = traits.List(File(exists=True), minlen=2, maxlen=2, mandatory=True,
+                             desc="GIFTI pial surfaces (left, right)")
+    subjects_dir = Directory(exists=True, mandatory=True, desc="FreeSurfer SUBJECTS_DIR")
+    subject_id = traits.Str(mandatory=True, desc="FreeSurfer subject ID of the surfaces")
+    target_subject = traits.Str(mandatory=True,
+                                desc="FreeSurfer subject ID to resample the samples onto")
+    sampling_fractions = traits.List(
+        traits.Float, [0.0, 0.2, 0.4, 0.6, 0.8, 1.0], usedefault=True,
+        desc="Depths (as fractions of the distance from white to pial) to sample at")
+    chunk_size = traits.Int(32, usedefault=True,
+                            desc="Number of frames read from the BOLD series at a time")
+
+
+class _VolumeToSurfaceOutputSpec(TraitedSpec):
+    out_files = OutputMultiObject(File(exists=True),
+                                  desc="Sampled BOLD series (left, right) in GIFTI format")
+
+
+class VolumeToSurface(SimpleInterface):
+    """
+    Sample a BOLD series onto the cortical surfaces of a FreeSurfer subject.
+
+    For each vertex, the BOLD series is linearly interpolated at several depths
+    between the white and pial surfaces, and the samples are averaged.
+    Vertices outside the cortex label are set to zero.
+    Samples are then resampled to ``target_subject`` by nearest-neighbor
+    forward and reverse mapping on the spherical registrations, as in
+    FreeSurfer's ``mri_vol2surf --trgsubject``.
+    The ``AnatomicalStructurePrimary`` metadata of the outputs is set
+    (``CortexLeft`` or ``CortexRight``).
+
+    """
+
+    input_spec = _VolumeToSurfaceInputSpec
+    output_spec = _VolumeToSurfaceOutputSpec
+
+    def _run_interface(self, runtime):
+        # Open the series lazily and read it in blocks of frames, so that the
+        # whole series is never resident in memory
+        img = nb.load(self.inputs.in_file, mmap=True, keep_file_open=True)
+        n_frames = img.shape[3] if img.ndim == 4 else 1
+        subject_dir = os.path.join(self.inputs.subjects_dir, self.inputs.subject_id)
+
+        resampling = [
+            ribbon_sampling_matrix(
+                img.shape[:3],
+                img.affine,
+                nb.load(white).agg_data("pointset"),
+                nb.load(pial).agg_data("pointset"),
+                self.inputs.sampling_fractions,
+            )
+            for white, pial in zip(self.inputs.white_surfs, self.inputs.pial_surfs)
+        ]
+        samples = [np.zeros((m.shape[0], n_frames), dtype=np.float32) for m in resampling]
+        for start in range(0, n_frames, self.inputs.chunk_size):
+            stop = min(start + self.inputs.chunk_size, n_frames)
+            block = np.asarray(
+                img.dataobj[..., start:stop] if img.ndim == 4 else img.dataobj,
+                dtype=np.float32,
+            ).reshape((-1, stop - start))
+            for hemi_matrix, hemi_samples in zip(resampling, samples):
+                hemi_samples[:, start:stop] = hemi_matrix @ block
+        del block
+
+        self._results["out_files"] = []
+        for hemi, hemi_samples in zip(("lh", "rh"), samples):
+            cortex = nb.freesurfer.read_label(
+                os.path.join(subject_dir, "label", f"{hemi}.cortex.label")
+            )
+            mask = np.zeros(hemi_samples.shape[0], dtype=bool)
+            mask[cortex] = True
+            hemi_samples[~mask] = 0
+
+            if self.inputs.target_subject != self.inputs.subject_id:
+                src_sphere = nb.freesurfer.read_geometry(
+                    os.path.join(subject_dir, "surf", f"{hemi}.sphere.reg")
+                )[0]
+                trg_sphere = nb.freesurfer.read_geometry(
+                    os.path.join(
+                        self.inputs.subjects_dir,
+                        self.inputs.target_subject,
+                        "surf",
+                        f"{hemi}.sphere.reg",
+                    )
+                )[0]
+                hemi_samples = nnfr_matrix(src_sphere, trg_sphere) @ hemi_samples
+
+            out_file = fname_presuffix(
+                self.inputs.in_file,
+                prefix=f"{hemi}.",
+                suffix=".gii",
+                use_ext=False,
+                newpath=runtime.cwd,
+            )
+            nb.GiftiImage(
+                meta=nb.gifti.GiftiMetaData.from_dict(
+                    {"AnatomicalStructurePrimary": _STRUCTURES[hemi]}
+                ),
+                darrays=[
+                    nb.gifti.GiftiDataArray(
+                        np.ascontiguousarray(frame, dtype=np.float32),
+                        intent="NIFTI_INTENT_TIME_SERIES",
+                        datatype="NIFTI_TYPE_FLOAT32",
+                    )
+                    for frame in hemi_samples.T
+                ]
+            ).to_filename(out_file)
+            self._results["out_files"].append(out_file)
+        return runtime
+
+
+def ribbon_sampling_matrix(shape, affine, white, pial, fractions):
+    """
+    Build the matrix sampling a volume at several depths between two surfaces.
+
+    Each row holds the trilinear interpolation weights of one vertex, averaged
+    over the sampling depths, so that the ribbon average of a series is the product
+    of this matrix with the (voxels, time) array of the series.
+
+    Parameters
+    ----------
+    shape : :obj:`tuple`
+        Shape of the (3D) sampled volume.
+    affine : :obj:`numpy.ndarray`
+        Voxel-to-world affine of the sampled volume.
+    white, pial : :obj:`numpy.ndarray`
+        Vertex coordinates (world space) of the surfaces, of shape ``(V, 3)``.
+    fractions : :obj:`list` of :obj:`float`
+        Depths, as fractions of the distance from ``white`` to ``pial``.
+
+    Returns
+    -------
+    resampling : :obj:`scipy.sparse.csr_matrix`
+        Array of shape ``(V, N_voxels)``, in C (row-major) voxel order.
+
+    Examples
+    --------
+    >>> data = np.arange(64, dtype=np.float32).reshape((4, 4, 4, 1))
+    >>> white = np.array([[1.0, 1.0, 1.0], [2.0, 1.0, 1.0]])
+    >>> resampling = ribbon_sampling_matrix((4, 4, 4), np.eye(4), white, white + 1, [0, 0.5, 1])
+    >>> resampling @ data.reshape((-1, 1))
+    array([[31.5],
+           [47.5]], dtype=float32)
+
+    """
+    from scipy.sparse import csr_matrix
+
+    fractions = np.asarray(fractions, dtype=float)
+    n_vertices = white.shape[0]
+    shape = np.array(shape[:3])
+    coords = white + fractions[:, np.newaxis, np.newaxis] * (pial - white)
+    ijk = nb.affines.apply_affine(np.linalg.inv(affine), coords).reshape(-1, 3)
+
+    # Points outside the volume sample zero; those on the far edges interpolate
+    # within the last voxel
+    inside = np.all((ijk >= 0) & (ijk <= shape - 1), axis=1)
+    ijk = ijk[inside]
+    vertices = np.tile(np.arange(n_vertices), len(fractions))[inside]
+    corner = np.clip(np.floor(ijk), 0, np.maximum(shape - 2, 0)).astype(int)
+    frac = ijk - corner
+
+    # Trilinear weights and voxel indices of the 8 neighbors, computed once for
+    # the whole series. Duplicated entries (across depths) are summed by the
+    # sparse matrix, so the depth average is folded into the weights.
+    rows, cols, weights = [], [], []
+    for offset in np.ndindex(2, 2, 2):
+        rows.append(vertices)
+        cols.append(np.ravel_multi_index((corner + offset).T, tuple(shape)))
+        weights.append(np.prod(np.where(offset, frac, 1.0 - frac), axis=1))
+    # Single precision weights, so that the product does not upcast the series
+    weights = (np.concatenate(weights) / len(fractions)).astype(np.float32)
+    return csr_matrix(
+        (weights, (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_vertices, int(np.prod(shape))),
+    )
+
+
+def nnfr_matrix(src_sphere, trg_sphere):
+    """
+    Build the nearest-neighbor forward and reverse resampling matrix between two spheres.
+
+    Each target vertex takes the average of its nearest source vertex (forward mapping)
+    and of all source vertices not used in the forward mapping for which it is the
+    nearest target vertex (reverse mapping).
+
+    Parameters
+    ----------
+    src_sphere, trg_sphere : :obj:`numpy.ndarray`
+        Vertex coordinates of the registered source and target spheres.
+
+    Returns
+    -------
+    weights : :obj:`scipy.sparse.csr_matrix`
+        Array of shape ``(N_target, N_source)``.
+
+    Examples
+    --------
+    >>> src = np.array([[1.0, 0, 0], [0.9, 0.1, 0], [0, 1.0, 0], [0, 0, 1.0]])
+    >>> trg = np.array([[1.0, 0, 0], [0, 0.9, 0.1]])
+    >>> nnfr_matrix(src, trg).toarray()
+    array([[0.5, 0.5, 0. , 0. ],
+           [0. , 0. , 0.5, 0.5]])
+
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import cKDTree
+
+    n_trg, n_src = len(trg_sphere), len(src_sphere)
+    forward = cKDTree(src_sphere).query(trg_sphere)[1]
+    unmapped = np.setdiff1d(np.arange(n_src), forward)
+    reverse = cKDTree(trg_sphere).query(src_sphere[unmapped])[1]
+
+    rows = np.concatenate((np.arange(n_trg), reverse))
+    cols = np.concatenate((forward, unmapped))
+    counts = np.bincount(rows, minlength=n_trg)
+    return csr_matrix((1.0 / counts[rows], (rows, cols)), shape=(n_trg, n_src))
+
+
+class _ResampleMetricInputSpec(BaseInterfaceInputSpec):
+    in_file = File(exists=True, mandatory=True, desc="GIFTI metric (or series) to resample")
+    current_sphere = File(exists=True, mandatory=True,
+                          desc="Registered sphere the metric is defined on")
+    new_sphere = File(exists=True, mandatory=True,
+                      desc="Sphere, registered to ``current_sphere``, to resample onto")
+    current_area = File(exists=True, mandatory=True,
+                        desc="Vertex areas of the (midthickness) surface of ``in_file``")
+    new_area = File(exists=True, mandatory=True,
+                    desc="Vertex areas of the (midthickness) surface to resample onto")
+    out_file = File(desc="Name of the resampled metric")
+
+
+class _ResampleMetricOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="Resampled metric")
+
+
+class ResampleMetric(SimpleInterface):
+    """
+    Resample a GIFTI metric between registered spheres, in-process.
+
+    Replaces ``wb_command -metric-resample`` with the ``ADAP_BARY_AREA`` method:
+    the (sparse) weights of each pair of spheres and areas are computed once, with
+    :func:`adap_bary_area_matrix`, and all the frames of the series are resampled
+    with a single product.
+
+    """
+
+    input_spec = _ResampleMetricInputSpec
+    output_spec = _ResampleMetricOutputSpec
+
+    def _run_interface(self, runtime):
+        img = nb.load(self.inputs.in_file)
+        data = np.stack([darray.data for darray in img.darrays], axis=-1)
+        resampled = _adap_bary_area_matrix(
+            self.inputs.current_sphere,
+            self.inputs.new_sphere,
+            self.inputs.current_area,
+            self.inputs.new_area,
+        ) @ data.astype(np.float32)
+
+        self._results["out_file"] = os.path.join(
+            runtime.cwd,
+            self.inputs.out_file if isdefined(self.inputs.out_file)
+            else fname_presuffix(self.inputs.in_file, suffix="_resampled", use_ext=True),
+        )
+        nb.GiftiImage(
+            meta=img.meta,
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    np.ascontiguousarray(frame, dtype=np.float32),
+                    intent=darray.intent,
+                    datatype="NIFTI_TYPE_FLOAT32",
+                    meta=darray.meta,
+                )
+                for frame, darray in zip(resampled.T, img.darrays)
+            ]
+        ).to_filename(self._results["out_file"])
+        return runtime
+
+
+@lru_cache(maxsize=2)
+def _adap_bary_area_matrix(current_sphere, new_sphere, current_area, new_area):
+    current = nb.load(current_sphere)
+    new = nb.load(new_sphere)
+    return adap_bary_area_matrix(
+        current.agg_data("pointset"),
+        current.agg_data("triangle"),
+        new.agg_data("pointset"),
+        new.agg_data("triangle"),
+        nb.load(current_area).darrays[0].data,
+        nb.load(new_area).darrays[0].data,
+    )
+
+
+def barycentric_matrix(src_vertices, src_faces, trg_vertices, chunk_size=16384):
+    """
+    Build the barycentric interpolation matrix of a sphere at the vertices of another.
+
+    Each target vertex is projected (from the center of the spheres) onto the source
+    triangle that contains it, and interpolates the three vertices of that triangle.
+
+    Parameters
+    ----------
+    src_vertices, trg_vertices : :obj:`numpy.ndarray`
+        Vertex coordinates of the (registered, origin-centered) spheres.
+    src_faces : :obj:`numpy.ndarray`
+        Triangles of the source sphere, of shape ``(F, 3)``.
+    chunk_size : :obj:`int`
+        Number of target vertices processed at a time.
+
+    Returns
+    -------
+    weights : :obj:`scipy.sparse.csr_matrix`
+        Array of shape ``(N_target, N_source)``.
+
+    Examples
+    --------
+    >>> src = np.array([[1.0, 0, 0], [0, 1.0, 0], [0, 0, 1.0]])
+    >>> trg = np.array([[1.0, 1.0, 2.0], [1.0, 0, 0]])
+    >>> barycentric_matrix(src, np.array([[0, 1, 2]]), trg).toarray()
+    array([[0.25, 0.25, 0.5 ],
+           [1.  , 0.  , 0.  ]])
+
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import cKDTree
+
+    src_vertices = np.asarray(src_vertices, dtype=float)
+    trg_vertices = np.asarray(trg_vertices, dtype=float)
+    src_faces = np.asarray(src_faces, dtype=int)
+
+    # The triangles incident to each source vertex (padded with -1)
+    order = np.argsort(src_faces.ravel(), kind="stable")
+    vertex = src_faces.ravel()[order]
+    first = np.searchsorted(vertex, vertex)
+    incident = np.full((len(src_vertices), np.bincount(vertex).max()), -1)
+    incident[vertex, np.arange(len(vertex)) - first] = order // 3
+
+    # Weights of a point p in triangle (a, b, c) are proportional to the triple
+    # products (p, b, c), (p, c, a) and (p, a, b) of the gnomonic projection
+    a, b, c = (src_vertices[src_faces[:, i]] for i in range(3))
+    duals = np.stack((np.cross(b, c), np.cross(c, a), np.cross(a, b)), axis=1)
+    orientation = np.sign(np.einsum("fk,fk->f", a, duals[:, 0]))
+
+    # Candidates are the triangles around the nearest source vertices
+    nearest = cKDTree(src_vertices).query(trg_vertices, k=min(3, len(src_vertices)))[1]
+    candidates = incident[nearest.reshape((len(trg_vertices), -1))]
+    candidates = candidates.reshape((len(trg_vertices), -1))
+
+    faces = np.zeros(len(trg_vertices), dtype=int)
+    weights = np.zeros((len(trg_vertices), 3))
+    score = np.zeros(len(trg_vertices))
+    for start in range(0, len(trg_vertices), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        faces[chunk], weights[chunk], score[chunk] = _containing_faces(
+            trg_vertices[chunk], candidates[chunk], duals, orientation
+        )
+
+    # Points not contained by any triangle around their nearest vertices (e.g., close
+    # to long, thin triangles) are searched for through all the triangles
+    every_face = np.arange(len(src_faces))[np.newaxis]
+    for index in np.flatnonzero(score < -1e-6):
+        faces[index], weights[index], score[index] = _containing_faces(
+            trg_vertices[[index]], every_face, duals, orientation
+        )
+
+    # Remaining points fall in gaps of the tessellation: take the least-outside triangle
+    weights = np.clip(weights, 0, None)
+    weights /= weights.sum(axis=-1, keepdims=True)
+    return csr_matrix(
+        (weights.ravel(), (np.repeat(np.arange(len(trg_vertices)), 3), src_faces[faces].ravel())),
+        shape=(len(trg_vertices), len(src_vertices)),
+    )
+
+
+def _containing_faces(points, candidates, duals, orientation):
+    """Find the candidate triangle containing each point, and its barycentric weights."""
+    valid = candidates >= 0
+    candidates = np.where(valid, candidates, 0)
+    raw = np.einsum("nk,ncjk->ncj", points, duals[candidates])
+    total = raw.sum(axis=-1)
+    # Discard triangles on the far side of the sphere, and degenerate ones
+    valid &= total * orientation[candidates] > 0
+    weights = raw / np.where(valid, total, 1.0)[..., np.newaxis]
+    # The containing triangle has all weights positive
+    score = np.where(valid, weights.min(axis=-1), -np.inf)
+    best = score.argmax(axis=-1)
+    rows = np.arange(len(best))
+    return candidates[rows, best], weights[rows, best], score[rows, best]
+
+
+def adap_bary_area_matrix(current_vertices, current_faces, new_vertices, new_faces,
+                          current_area, new_area):
+    """
+    Build the adaptive barycentric, area-corrected, resampling matrix between two spheres.
+
+    Follows the ``ADAP_BARY_AREA`` method of Workbench's ``-metric-resample``: each new
+    vertex takes the barycentric weights of the current vertices (forward mapping),
+    unless current vertices outside its forward triangle map onto it by barycentric
+    interpolation on the new sphere (reverse mapping, when downsampling).
+    Weights are then scaled by the areas of the new vertices, the contributions of
+    each current vertex are normalized and scaled by its area, and the weights of
+    each new vertex are normalized.
+
+    Parameters
+    ----------
+    current_vertices, new_vertices : :obj:`numpy.ndarray`
+        Vertex coordinates of the registered spheres.
+    current_faces, new_faces : :obj:`numpy.ndarray`
+        Triangles of the spheres.
+    current_area, new_area : :obj:`numpy.ndarray`
+        Vertex areas of the (midthickness) surfaces of the current and new meshes.
+
+    Returns
+    -------
+    weights : :obj:`scipy.sparse.csr_matrix`
+        Array of shape ``(N_new, N_current)``, in single precision.
+
+    Examples
+    --------
+    >>> octahedron = np.vstack((np.eye(3), -np.eye(3)))
+    >>> faces = np.array([[0, 1, 2], [1, 3, 2], [3, 4, 2], [4, 0, 2],
+    ...                   [1, 0, 5], [3, 1, 5], [4, 3, 5], [0, 4, 5]])
+    >>> weights = adap_bary_area_matrix(
+    ...     octahedron, faces, octahedron, faces, np.ones(6), np.ones(6))
+    >>> np.allclose(weights.toarray(), np.eye(6))
+    True
+
+    """
+    from scipy.sparse import diags
+
+    forward = barycentric_matrix(current_vertices, current_faces, new_vertices)
+    reverse = barycentric_matrix(new_vertices, new_faces, current_vertices).T.tocsr()
+    forward.eliminate_zeros()
+    reverse.eliminate_zeros()
+
+    # Use the reverse mapping where it involves current vertices the forward one misses
+    reverse_only = (reverse > 0).astype(int) - (reverse > 0).multiply(forward > 0)
+    use_reverse = np.asarray(reverse_only.sum(axis=1)).ravel() > 0
+    weights = diags(np.asarray(new_area, dtype=float)) @ (
+        diags((~use_reverse).astype(float)) @ forward
+        + diags(use_reverse.astype(float)) @ reverse
+    )
+
+    # Area correction: what each current vertex spreads sums up to its area
+    spread = np.asarray(weights.sum(axis=0)).ravel()
+    correction = np.divide(
+        np.asarray(current_area, dtype=float), spread,
+        out=np.zeros_like(spread), where=spread > 0,
+    )
+    weights = weights @ diags(correction)
+
+    totals = np.asarray(weights.sum(axis=1)).ravel()
+    totals[totals == 0] = 1.0
+    return (diags(1.0 / totals) @ weights).astype(np.float32).tocsr()
@@ -1,7 +1,7 @@
 import nibabel as nb
 import numpy as np
 from nipype.pipeline import engine as pe
-from fmriprep.interfaces.maths import Clip
+from fmriprep.interfaces.maths import Clip, CovModulate, GoodVoxelsMask, MakeRibbon
 
 
 def test_Clip(tmp_path):
@@ -49,3 +49,82 @@ def test_Clip(tmp_path):
     assert ret.outputs.out_file == str(tmp_path / "nonpositive/input_clipped.nii")
     out_img = nb.load(ret.outputs.out_file)
     assert np.allclose(out_img.get_fdata(), [[[-1., 0.], [-2., 0.]]])
+
+
+def test_MakeRibbon(tmp_path):
+    white, pial = [], []
+    # White distances are positive outside the white surface, pial distances
+    # are negative inside the pial surface
+    for hemi, offset in (("lh", 0), ("rh", 2)):
+        wdata = np.full((4, 1, 1), -1.)
+        wdata[offset:offset + 2] = [[[1.]], [[0.]]]
+        pdata = np.full((4, 1, 1), 1.)
+        pdata[offset:offset + 2] = -1.
+        white.append(str(tmp_path / f"{hemi}.white.nii"))
+        pial.append(str(tmp_path / f"{hemi}.pial.nii"))
+        nb.Nifti1Image(wdata, np.eye(4)).to_filename(white[-1])
+        nb.Nifti1Image(pdata, np.eye(4)).to_filename(pial[-1])
+
+    ribbon = pe.Node(
+        MakeRibbon(white_distvols=white, pial_distvols=pial),
+        name="ribbon",
+        base_dir=tmp_path)
+
+    ret = ribbon.run()
+
+    out_img = nb.load(ret.outputs.ribbon)
+    assert out_img.get_data_dtype() == np.uint8
+    assert np.array_equal(np.asanyarray(out_img.dataobj).ravel(), [1, 0, 1, 0])
+
+
+def test_CovModulate(tmp_path):
+    rng = np.random.default_rng(1234)
+    data = 100 + rng.standard_normal((6, 6, 6, 20))
+    # One noisy voxel within the ribbon
+    data[2, 2, 2] = 100 + 10 * rng.standard_normal(20)
+    in_file = str(tmp_path / "bold.nii")
+    nb.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+
+    ribbon = np.zeros((6, 6, 6), dtype=np.uint8)
+    ribbon[1:5, 1:5, 1:5] = 1
+    mask_file = str(tmp_path / "ribbon.nii")
+    nb.Nifti1Image(ribbon, np.eye(4)).to_filename(mask_file)
+
+    cov = pe.Node(
+        CovModulate(in_file=in_file, mask_file=mask_file, sigma=1.0),
+        name="cov",
+        base_dir=tmp_path)
+
+    ret = cov.run()
+
+    modulated = nb.load(ret.outputs.out_file).get_fdata()
+    assert modulated.shape == (6, 6, 6)
+    assert np.unravel_index(np.argmax(modulated), modulated.shape) == (2, 2, 2)
+    assert np.isclose(ret.outputs.ribbon_mean, modulated[ribbon == 1].mean())
+    assert np.isclose(ret.outputs.ribbon_std, modulated[ribbon == 1].std(ddof=1))
+    assert np.allclose(nb.load(ret.outputs.mean_file).get_fdata(), data.mean(axis=-1))
+
+
+def test_GoodVoxelsMask(tmp_path):
+    cov = np.array([[[0.5, 2.0], [1.0, 0.0]], [[0.5, 0.5], [3.0, 0.2]]])
+    mean = np.array([[[100, 100], [100, 0]], [[100, 100], [100, 100]]])
+    ribbon = np.array([[[1, 1], [1, 1]], [[0, 1], [1, 1]]], dtype=np.uint8)
+    files = []
+    for name, data in (("cov", cov), ("mean", mean), ("ribbon", ribbon)):
+        files.append(str(tmp_path / f"{name}.nii"))
+        nb.Nifti1Image(data, np.eye(4)).to_filename(files[-1])
+
+    goodvoxels = pe.Node(
+        GoodVoxelsMask(in_file=files[0], mean_file=files[1], mask_file=files[2],
+                       threshold=1.0),
+        name="goodvoxels",
+        base_dir=tmp_path)
+
+    ret = goodvoxels.run()
+
+    out_img = nb.load(ret.outputs.out_file)
+    assert out_img.get_data_dtype() == np.uint8
+    assert np.array_equal(
+        np.asanyarray(out_img.dataobj),
+        [[[1, 0], [0, 0]], [[0, 1], [0, 1]]],
+    )
@@ -0,0 +1,241 @@
+import h5py
+import nibabel as nb
+import numpy as np
+from nipype.pipeline import engine as pe
+from fmriprep.interfaces.resampling import ComposeTransforms, ResampleLabels, ResampleSeries
+
+ITK_TEMPLATE = """\
+#Transform {index}
+Transform: MatrixOffsetTransformBase_double_3_3
+Parameters: 1 0 0 0 1 0 0 0 1 {translation}
+FixedParameters: 0 0 0
+"""
+
+
+def _write_itk(fname, translations):
+    fname.write_text("#Insight Transform File V1.0\n" + "".join(
+        ITK_TEMPLATE.format(index=i, translation=" ".join(map(str, t)))
+        for i, t in enumerate(translations)
+    ))
+    return str(fname)
+
+
+def _write_composite(fname, translation, displacement, matrix=(1, 0, 0, 0, 1, 0, 0, 0, 1),
+                     center=(0, 0, 0)):
+    # A composite of an affine (applied last) and a displacements field (applied
+    # first), defined on the grid of the test images (LPS direction flipping x and y).
+    # Displacements are LPS vectors, either constant or of shape (6, 6, 6, 3).
+    displacement = np.broadcast_to(np.asarray(displacement, dtype=np.float32), (6, 6, 6, 3))
+    with h5py.File(fname, "w") as h5file:
+        group = h5file.create_group("TransformGroup")
+        group.create_group("0")["TransformType"] = [b"CompositeTransform_double_3_3"]
+        affine = group.create_group("1")
+        affine["TransformType"] = [b"AffineTransform_double_3_3"]
+        affine["TransformParameters"] = list(matrix) + list(translation)
+        affine["TransformFixedParameters"] = np.asarray(center, dtype=float)
+        field = group.create_group("2")
+        field["TransformType"] = [b"DisplacementFieldTransform_float_3_3"]
+        # ITK stores vectors voxel-wise, with the first axis varying fastest
+        field["TransformParameters"] = displacement.transpose(2, 1, 0, 3).ravel()
+        field["TransformFixedParameters"] = (
+            [6.0, 6, 6, 0, 0, 0, 1, 1, 1] + [-1.0, 0, 0, 0, -1, 0, 0, 0, 1]
+        )
+    return str(fname)
+
+
+def test_ResampleSeries(tmp_path):
+    data = np.arange(6 ** 3, dtype=np.int16).reshape((6, 6, 6))
+    series = np.stack((data, data + 1), axis=-1)
+    # Compressed series are read at once, uncompressed ones volume by volume
+    in_file = str(tmp_path / "bold.nii.gz")
+    in_img = nb.Nifti1Image(series, np.eye(4))
+    in_img.header.set_xyzt_units(xyz="mm")
+    in_img.to_filename(in_file)
+    in_file_mmap = str(tmp_path / "bold_mmap.nii")
+    nb.Nifti1Image(series, np.eye(4)).to_filename(in_file_mmap)
+
+    # Volume-wise shifts along the z-axis (equal in LPS and RAS)
+    hmc = _write_itk(tmp_path / "hmc.txt", [(0, 0, 1), (0, 0, -1)])
+    header_source = str(tmp_path / "source.nii")
+    src_img = nb.Nifti1Image(np.zeros((6, 6, 6, 2), dtype=np.int16), np.eye(4))
+    src_img.header.set_zooms((1.0, 1.0, 1.0, 2.5))
+    src_img.header.set_xyzt_units(t="sec")
+    src_img.to_filename(header_source)
+    resample = pe.Node(
+        ResampleSeries(
+            input_image=in_file,
+            transforms=["identity", hmc],
+            reference_image=in_file,
+            header_source=header_source,
+            order=1,
+            copy_dtype=True,
+        ),
+        name="resample",
+        base_dir=str(tmp_path),
+    )
+    ret = resample.run()
+
+    assert ret.outputs.out_file.endswith("bold_resampled.nii.gz")
+    out_img = nb.load(ret.outputs.out_file)
+    assert out_img.shape == (6, 6, 6, 2)
+    assert out_img.header.get_zooms() == (1.0, 1.0, 1.0, 2.5)
+    assert out_img.header.get_xyzt_units() == ("mm", "sec")
+    assert out_img.get_data_dtype() == np.int16
+    # The output is scaled to fit the data type of the inputs
+    out_data = out_img.get_fdata()
+    assert np.allclose(out_data[..., :-1, 0], data[..., 1:], atol=0.01)
+    assert np.allclose(out_data[..., -1, 0], 0, atol=0.01)
+    assert np.allclose(out_data[..., 1:, 1], data[..., :-1] + 1, atol=0.01)
+
+    # An LPS shift of (-1, 0, 0) is a RAS shift of (1, 0, 0)
+    composite = _write_composite(tmp_path / "xfm.h5", [-1.0, 0, 0], [0, 0, 1])
+    resample = pe.Node(
+        ResampleSeries(
+            input_image=in_file_mmap,
+            transforms=[composite],
+            reference_image=in_file,
+            order=1,
+            compress=False,
+        ),
+        name="resample_composite",
+        base_dir=str(tmp_path),
+    )
+    ret = resample.run()
+
+    assert ret.outputs.out_file.endswith("bold_mmap_resampled.nii")
+    out_img = nb.load(ret.outputs.out_file)
+    assert out_img.get_data_dtype() == np.float32
+    assert np.allclose(out_img.get_fdata()[:-1, :, :-1], series[1:, :, 1:])
+
+    # Shared transforms are composed before the volume-wise ones
+    resample = pe.Node(
+        ResampleSeries(
+            input_image=in_file_mmap,
+            transforms=[composite, hmc],
+            reference_image=in_file,
+            order=1,
+            num_threads=2,
+        ),
+        name="resample_chain",
+        base_dir=str(tmp_path),
+    )
+    ret = resample.run()
+
+    out_data = nb.load(ret.outputs.out_file).get_fdata()
+    assert np.allclose(out_data[:-1, :, :-2, 0], data[1:, :, 2:])
+    assert np.allclose(out_data[:-1, ..., 1], data[1:] + 1)
+
+
+def test_ResampleLabels(tmp_path):
+    labels = np.arange(4 ** 3, dtype=np.int16).reshape((4, 4, 4))
+    in_files = []
+    for name, data in (("aseg", labels), ("mask", (labels > 31).astype(np.uint8))):
+        in_files.append(str(tmp_path / f"{name}.nii.gz"))
+        nb.Nifti1Image(data, np.eye(4)).to_filename(in_files[-1])
+    # The reference grid, at twice the resolution (voxel centers off the input ones)
+    ref_file = str(tmp_path / "ref.nii")
+    ref_affine = np.diag([0.5, 0.5, 0.5, 1.0])
+    ref_affine[:3, 3] = 0.25
+    nb.Nifti1Image(np.zeros((8, 8, 8), dtype=np.float32), ref_affine).to_filename(ref_file)
+    shift = _write_itk(tmp_path / "shift.txt", [(0, 0, 1)])
+
+    resample = pe.Node(
+        ResampleLabels(in_files=in_files, transforms=[shift], reference_image=ref_file),
+        name="resample_labels",
+        base_dir=str(tmp_path),
+    )
+    ret = resample.run()
+
+    assert [f.split("/")[-1] for f in ret.outputs.out_files] == [
+        "aseg_trans.nii.gz", "mask_trans.nii.gz"]
+    aseg, mask = (nb.load(f) for f in ret.outputs.out_files)
+    assert aseg.shape == (8, 8, 8)
+    assert aseg.get_data_dtype() == np.int16
+    assert mask.get_data_dtype() == np.uint8
+    # Nearest neighbors, shifted by one voxel of the input along z; zero outside
+    ij = [0, 1, 1, 2, 2, 3, 3]
+    k = [1, 2, 2, 3, 3]
+    expected = np.zeros((8, 8, 8))
+    expected[:7, :7, :5] = labels[np.ix_(ij, ij, k)]
+    assert np.all(aseg.get_fdata() == expected)
+    assert np.all(mask.get_fdata() == (expected > 31))
+
+
+def test_ComposeTransforms(tmp_path):
+    data = np.arange(6 ** 3, dtype=np.float32).reshape((6, 6, 6))
+    in_file = str(tmp_path / "ref.nii")
+    nb.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+    composite = _write_composite(tmp_path / "xfm.h5", [-1.0, 0, 0], [0, 0, 1])
+
+    compose = pe.Node(
+        ComposeTransforms(transforms=[composite], reference_image=in_file),
+        name="compose",
+        base_dir=str(tmp_path),
+    )
+    ret = compose.run()
+
+    field = nb.load(ret.outputs.out_file)
+    assert field.shape == (6, 6, 6, 1, 3)
+    assert field.header.get_intent()[0] == "vector"
+    # Displacements are in LPS
+    assert np.allclose(field.get_fdata(), [-1.0, 0, 1])
+
+    # The field and the composite resample identically onto its grid
+    outputs = []
+    for name, transform in (("composite", composite), ("field", ret.outputs.out_file)):
+        resample = pe.Node(
+            ResampleSeries(input_image=in_file, transforms=[transform],
+                           reference_image=in_file, order=1),
+            name=f"resample_{name}",
+            base_dir=str(tmp_path),
+        )
+        outputs.append(nb.load(resample.run().outputs.out_file).get_fdata())
+    assert outputs[0].shape == (6, 6, 6)
+    assert np.allclose(outputs[0], outputs[1])
+
+
+def test_ComposeTransforms_noncommuting(tmp_path):
+    from nitransforms.io.itk import ITKDisplacementsField, ITKLinearTransform
+    from nitransforms.linear import Affine
+    from nitransforms.manip import TransformChain
+    from nitransforms.nonlinear import DisplacementsFieldTransform
+    from nibabel.affines import from_matvec
+
+    from fmriprep.utils.transforms import load_transform, map_points
+
+    in_file = str(tmp_path / "ref.nii")
+    nb.Nifti1Image(np.zeros((6, 6, 6), dtype=np.float32), np.eye(4)).to_filename(in_file)
+    # A rotation about the z-axis, off the origin, and a spatially varying field
+    cos, sin = np.cos(np.pi / 6), np.sin(np.pi / 6)
+    matrix = [cos, -sin, 0, sin, cos, 0, 0, 0, 1]
+    translation, center = [0.5, -1.0, 2.0], [1.0, 2.0, 3.0]
+    displacement = np.random.default_rng(1234).normal(size=(6, 6, 6, 3)).astype(np.float32)
+    composite = _write_composite(
+        tmp_path / "xfm.h5", translation, displacement, matrix=matrix, center=center
+    )
+
+    compose = pe.Node(
+        ComposeTransforms(transforms=[composite], reference_image=in_file),
+        name="compose",
+        base_dir=str(tmp_path),
+    )
+    field = nb.load(compose.run().outputs.out_file).get_fdata().reshape((-1, 3))
+    points = np.indices((6, 6, 6)).reshape((3, -1)).T.astype(float)
+    mapped = points + field * [-1.0, -1.0, 1.0]
+
+    # The same chain, as nitransforms reads it from the equivalent ITK files
+    field_file = str(tmp_path / "field.nii.gz")
+    field_img = nb.Nifti1Image(displacement[..., np.newaxis, :], np.eye(4))
+    field_img.header.set_intent("vector")
+    field_img.to_filename(field_file)
+    chain = TransformChain([
+        Affine(ITKLinearTransform(
+            parameters=from_matvec(np.reshape(matrix, (3, 3)), translation), offset=center,
+        ).to_ras()),
+        DisplacementsFieldTransform(ITKDisplacementsField.from_filename(field_file)),
+    ])
+    assert np.allclose(mapped, chain.map(points), atol=1e-4)
+
+    # Applying the transforms of the composite in the opposite order differs
+    reverse = map_points(load_transform(composite)[::-1], points)
+    assert not np.allclose(mapped, reverse, atol=0.1)
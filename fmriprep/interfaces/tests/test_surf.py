@@ -0,0 +1,171 @@
+import os
+
+import nibabel as nb
+import numpy as np
+import pytest
+from nipype.pipeline import engine as pe
+from fmriprep.interfaces.surf import ResampleMetric, VolumeToSurface
+
+
+skip_pytest = pytest.mark.skipif(
+    not os.getenv('FMRIPREP_REGRESSION_SOURCE')
+    or not os.getenv('FMRIPREP_REGRESSION_TARGETS'),
+    reason='FMRIPREP_REGRESSION_{SOURCE,TARGETS} env vars not set'
+)
+
+
+def _write_surf(fname, coords, faces=((0, 1, 2),)):
+    nb.GiftiImage(darrays=[
+        nb.gifti.GiftiDataArray(coords.astype(np.float32), intent="NIFTI_INTENT_POINTSET"),
+        nb.gifti.GiftiDataArray(np.array(faces, dtype=np.int32),
+                                intent="NIFTI_INTENT_TRIANGLE"),
+    ]).to_filename(str(fname))
+    return str(fname)
+
+
+def _write_metric(fname, data, **meta):
+    nb.GiftiImage(
+        meta=nb.gifti.GiftiMetaData.from_dict(meta),
+        darrays=[nb.gifti.GiftiDataArray(np.asarray(frame, dtype=np.float32),
+                                         intent="NIFTI_INTENT_TIME_SERIES")
+                 for frame in np.atleast_2d(data)],
+    ).to_filename(str(fname))
+    return str(fname)
+
+
+def test_VolumeToSurface(tmp_path):
+    subjects_dir = tmp_path / "subjects"
+    sphere = np.array([[100.0, 0, 0], [0, 100.0, 0], [0, 0, 100.0]])
+    for subject in ("sub-01", "fsaverage"):
+        (subjects_dir / subject / "surf").mkdir(parents=True)
+        (subjects_dir / subject / "label").mkdir()
+        for hemi in ("lh", "rh"):
+            nb.freesurfer.write_geometry(
+                str(subjects_dir / subject / "surf" / f"{hemi}.sphere.reg"),
+                sphere if subject == "sub-01" else sphere[::-1],
+                np.array([[0, 1, 2]]),
+            )
+            # The last vertex is out of the cortex
+            (subjects_dir / subject / "label" / f"{hemi}.cortex.label").write_text(
+                "#!ascii label\n2\n0 0.0 0.0 0.0 0.0\n1 0.0 0.0 0.0 0.0\n"
+            )
+
+    # Two timepoints, varying linearly along the first axis
+    data = np.zeros((5, 5, 5, 2))
+    data[..., 0] = np.arange(5)[:, np.newaxis, np.newaxis]
+    data[..., 1] = 2 * data[..., 0]
+    in_file = str(tmp_path / "fsaverage.nii")
+    nb.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+
+    white = np.array([[1.0, 1.0, 1.0], [2.0, 1.0, 1.0], [3.0, 1.0, 1.0]])
+    white_surfs = [_write_surf(tmp_path / f"{h}.white.gii", white) for h in ("lh", "rh")]
+    pial_surfs = [_write_surf(tmp_path / f"{h}.pial.gii", white + [1, 0, 0])
+                  for h in ("lh", "rh")]
+
+    for target, expected in (("sub-01", [1.5, 2.5, 0.0]), ("fsaverage", [0.0, 2.5, 1.5])):
+        sampler = pe.Node(
+            VolumeToSurface(
+                in_file=in_file,
+                white_surfs=white_surfs,
+                pial_surfs=pial_surfs,
+                subjects_dir=str(subjects_dir),
+                subject_id="sub-01",
+                target_subject=target,
+                chunk_size=1,
+            ),
+            name=f"sampler_{target}",
+            base_dir=str(tmp_path),
+        )
+        ret = sampler.run()
+
+        assert [f.split("/")[-1] for f in ret.outputs.out_files] == [
+            "lh.fsaverage.gii", "rh.fsaverage.gii"]
+        for out_file, structure in zip(ret.outputs.out_files, ("CortexLeft", "CortexRight")):
+            out_img = nb.load(out_file)
+            assert out_img.meta.metadata["AnatomicalStructurePrimary"] == structure
+            out_data = out_img.agg_data()
+            assert np.allclose(out_data[:, 0], expected)
+            assert np.allclose(out_data[:, 1], 2 * np.array(expected))
+
+
+def test_ResampleMetric(tmp_path):
+    octahedron = 100 * np.vstack((np.eye(3), -np.eye(3)))
+    faces = [[0, 1, 2], [1, 3, 2], [3, 4, 2], [4, 0, 2],
+             [1, 0, 5], [3, 1, 5], [4, 3, 5], [0, 4, 5]]
+    current_sphere = _write_surf(tmp_path / "current.surf.gii", octahedron, faces)
+    # Rotated by 45 degrees about the z-axis: new equatorial vertices fall halfway
+    # between two current vertices
+    rotation = np.array([[1.0, -1.0, 0], [1.0, 1.0, 0], [0, 0, np.sqrt(2)]]) / np.sqrt(2)
+    new_sphere = _write_surf(tmp_path / "new.surf.gii", octahedron @ rotation.T, faces)
+    current_area = _write_metric(tmp_path / "area.shape.gii", [1.0, 3.0, 1.0, 1.0, 1.0, 1.0])
+    new_area = _write_metric(tmp_path / "new_area.shape.gii", [2.0, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+    data = np.array([[5.0, 4.0, 1.0, 0.0, 0.0, 2.0], [10.0, 8.0, 2.0, 0.0, 0.0, 4.0]])
+    in_file = _write_metric(tmp_path / "bold.func.gii", data,
+                            AnatomicalStructurePrimary="CortexLeft")
+    resample = pe.Node(
+        ResampleMetric(
+            in_file=in_file,
+            current_sphere=current_sphere,
+            new_sphere=new_sphere,
+            current_area=current_area,
+            new_area=new_area,
+            out_file="resampled.func.gii",
+        ),
+        name="resample",
+        base_dir=str(tmp_path),
+    )
+    ret = resample.run()
+
+    assert ret.outputs.out_file.endswith("resampled.func.gii")
+    out_img = nb.load(ret.outputs.out_file)
+    assert out_img.meta.metadata["AnatomicalStructurePrimary"] == "CortexLeft"
+    # Equatorial vertices are weighted by the areas of their current neighbors,
+    # corrected for how much of each current vertex goes to every new vertex
+    expected = np.array([4.25, 8.0 / 3.0, 1.0, 0.0, 2.0, 2.0])
+    assert np.allclose(out_img.agg_data()[:, 0], expected)
+    assert np.allclose(out_img.agg_data()[:, 1], 2 * expected)
+
+
+@skip_pytest
+@pytest.mark.parametrize("hemi", ["L", "R"])
+def test_ResampleMetric_workbench(tmp_path, hemi):
+    """Compare against the targets generated from the same series with Workbench::
+
+        wb_command -metric-resample hemi-{hemi}_space-fsaverage_bold.func.gii \\
+            <fsaverage 164k sphere> <fsLR 32k sphere (space-fsaverage)> ADAP_BARY_AREA \\
+            hemi-{hemi}_space-fsLR_den-91k_bold.func.gii \\
+            -area-metrics <fsaverage 164k vaavg> <fsLR 32k vaavg>
+
+    """
+    import templateflow.api as tf
+
+    in_file = os.path.join(
+        os.getenv('FMRIPREP_REGRESSION_SOURCE'),
+        'fsaverage', 'hemi-%s_space-fsaverage_bold.func.gii' % hemi,
+    )
+    target = os.path.join(
+        os.getenv('FMRIPREP_REGRESSION_TARGETS'),
+        'fsLR', 'hemi-%s_space-fsLR_den-91k_bold.func.gii' % hemi,
+    )
+    resample = pe.Node(
+        ResampleMetric(
+            in_file=in_file,
+            current_sphere=str(tf.get("fsaverage", hemi=hemi, density="164k",
+                                      desc="std", suffix="sphere", extension=".surf.gii")),
+            current_area=str(tf.get("fsaverage", hemi=hemi, density="164k", desc="vaavg",
+                                    suffix="midthickness", extension=".shape.gii")),
+            new_sphere=str(tf.get("fsLR", space="fsaverage", hemi=hemi, density="32k",
+                                  suffix="sphere", extension=".surf.gii")),
+            new_area=str(tf.get("fsLR", hemi=hemi, density="32k", desc="vaavg",
+                                suffix="midthickness", extension=".shape.gii")),
+            out_file="resampled.func.gii",
+        ),
+        name="resample",
+        base_dir=str(tmp_path),
+    )
+    out_data = nb.load(resample.run().outputs.out_file).agg_data()
+    expected = nb.load(target).agg_data()
+
+    assert out_data.shape == expected.shape
+    assert np.allclose(out_data, expected, rtol=1e-4, atol=1e-4 * np.abs(expected).max())
@@ -0,0 +1,40 @@
+import nibabel as nb
+import numpy as np
+from nipype.pipeline import engine as pe
+from fmriprep.interfaces.volume import IdentityReslice
+
+
+def test_IdentityReslice(tmp_path):
+    labels = np.zeros((4, 4, 4), dtype=np.uint8)
+    labels[:2, :2, :2] = 1
+    input_image = str(tmp_path / "labels.nii.gz")
+    nb.Nifti1Image(labels, np.eye(4)).to_filename(input_image)
+
+    # Same grid: data are passed through
+    same_ref = str(tmp_path / "same_ref.nii.gz")
+    nb.Nifti1Image(np.zeros((4, 4, 4, 3), dtype=np.float32), np.eye(4)).to_filename(same_ref)
+    # Coarser grid, shifted by one voxel of the input
+    coarse_ref = str(tmp_path / "coarse_ref.nii.gz")
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    affine[:3, 3] = 1
+    nb.Nifti1Image(np.zeros((3, 3, 3), dtype=np.float32), affine).to_filename(coarse_ref)
+
+    for ref, expected_shape in ((same_ref, (4, 4, 4)), (coarse_ref, (3, 3, 3))):
+        reslice = pe.Node(
+            IdentityReslice(input_image=input_image, reference_image=ref),
+            name=f"reslice_{expected_shape[0]}",
+            base_dir=str(tmp_path),
+        )
+        ret = reslice.run()
+        out_img = nb.load(ret.outputs.output_image)
+        assert out_img.shape == expected_shape
+        assert out_img.get_data_dtype() == np.uint8
+        assert np.allclose(out_img.affine, nb.load(ref).affine)
+
+        out_data = np.asanyarray(out_img.dataobj)
+        if expected_shape == (4, 4, 4):
+            assert np.array_equal(out_data, labels)
+        else:
+            expected = np.zeros(expected_shape, dtype=np.uint8)
+            expected[0, 0, 0] = 1
+            assert np.array_equal(out_data, expected)
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 # emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
 # vi: set ft=python sts=4 ts=4 sw=4 et:
-"""This module provides interfaces for workbench volume commands"""
+"""This module provides interfaces for workbench volume commands and volume reslicing"""
 import os
 
-from nipype.interfaces.base import TraitedSpec, File, traits, CommandLineInputSpec
+import numpy as np
+from nipype.interfaces.base import (
+    TraitedSpec, File, traits, CommandLineInputSpec, SimpleInterface, isdefined
+)
+from nipype.utils.filemanip import fname_presuffix
 from nipype.interfaces.workbench.base import WBCommand
 from nipype import logging
 
@@ -28,14 +32,12 @@ class CreateSignedDistanceVolumeInputSpec(CommandLineInputSpec):
     )
     out_vol = File(
         name_source=["surface"],
-        name_template="%s.distvol.nii.gz",
+        name_template="%s.distvol.nii",
         argstr="%s ",
         position=2,
         desc="output - the output volume",
     )
     roi_out = File(
-        name_source=["surface"],
-        name_template="%s.distvolroi.nii.gz",
         argstr="-roi-out %s ",
         position=3,
         desc="output roi volume of where the output has a computed value",
@@ -141,4 +143,55 @@ CREATE SIGNED DISTANCE VOLUME FROM SURFACE
 
     def _list_outputs(self):
         outputs = super(CreateSignedDistanceVolume, self)._list_outputs()
+        if isdefined(self.inputs.roi_out):
+            outputs["roi_out"] = os.path.abspath(self.inputs.roi_out)
         return outputs
+
+
+class IdentityResliceInputSpec(TraitedSpec):
+    input_image = File(exists=True, mandatory=True, desc="Label volume to reslice")
+    reference_image = File(exists=True, mandatory=True,
+                           desc="Image defining the output grid (only the header is read)")
+
+
+class IdentityResliceOutputSpec(TraitedSpec):
+    output_image = File(exists=True, desc="Label volume on the reference grid")
+
+
+class IdentityReslice(SimpleInterface):
+    """ Reslice a label volume onto the grid of a reference image, without a transform
+
+    Nearest-neighbor interpolation is used, and voxels falling outside of the
+    input volume are set to zero.
+    If both images share the same grid, the data are only re-headered.
+    """
+    input_spec = IdentityResliceInputSpec
+    output_spec = IdentityResliceOutputSpec
+
+    def _run_interface(self, runtime):
+        import nibabel as nb
+        from scipy.ndimage import map_coordinates
+
+        src = nb.load(self.inputs.input_image)
+        ref = nb.load(self.inputs.reference_image)
+        ref_shape = ref.shape[:3]
+        data = np.asanyarray(src.dataobj)
+
+        if not (src.shape[:3] == ref_shape and np.allclose(src.affine, ref.affine)):
+            ref2src = np.linalg.inv(src.affine) @ ref.affine
+            ijk = nb.affines.apply_affine(
+                ref2src, np.indices(ref_shape, dtype=np.float32).reshape(3, -1).T
+            )
+            data = map_coordinates(
+                data, ijk.T, order=0, mode="constant", cval=0, output=data.dtype
+            ).reshape(ref_shape)
+
+        header = ref.header.copy()
+        header.set_data_dtype(data.dtype)
+        header.set_data_shape(ref_shape)
+        out_file = fname_presuffix(
+            self.inputs.input_image, suffix="_resliced", newpath=runtime.cwd
+        )
+        ref.__class__(data, ref.affine, header).to_filename(out_file)
+        self._results["output_image"] = out_file
+        return runtime
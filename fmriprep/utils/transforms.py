@@ -0,0 +1,278 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2022 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Loading and applying ITK transforms in-process.
+
+Transforms follow the conventions of ``antsApplyTransforms``: they map points of
+the reference (fixed) space onto the input (moving) space, and a chain of transforms
+is given in the order that ``antsApplyTransforms -t`` takes them, i.e., the first
+transform of the chain is applied first to the reference points.
+Points are world (RAS+) coordinates, of shape ``(N, 3)``.
+
+"""
+from functools import lru_cache
+
+import numpy as np
+import nibabel as nb
+
+LPS = np.diag([-1.0, -1.0, 1.0, 1.0])
+
+
+class DisplacementsField:
+    """
+    A dense displacements field, defined on a voxel grid.
+
+    Displacements are linearly interpolated at the mapped points (clamping to the edge
+    of the grid within half a voxel of it), and are zero elsewhere, as ITK does.
+
+    Examples
+    --------
+    >>> field = np.zeros((3, 3, 3, 3), dtype=np.float32)
+    >>> field[..., 0] = np.arange(3)[:, np.newaxis, np.newaxis]
+    >>> DisplacementsField(field, np.eye(4)).map(np.array([[0.5, 1.0, 1.0], [5.0, 0, 0]]))
+    array([[1., 1., 1.],
+           [5., 0., 0.]])
+
+    """
+
+    def __init__(self, field, affine):
+        self.field = field
+        self.affine = affine
+
+    def map(self, points):
+        """Displace world-coordinates points."""
+        from scipy.ndimage import map_coordinates
+
+        ijk = apply_affine(np.linalg.inv(self.affine), points).T
+        inside = np.all(
+            (ijk >= -0.5) & (ijk <= np.reshape(self.field.shape[:3], (3, 1)) - 0.5), axis=0
+        )
+        return points + np.stack([
+            map_coordinates(self.field[..., i], ijk, order=1, mode="nearest") * inside
+            for i in range(3)
+        ], axis=-1)
+
+
+def grid_points(img):
+    """
+    Calculate the world coordinates of the voxels of an image.
+
+    Coordinates are single precision, as all points mapped from them.
+    The coordinates of the last grid are kept (read-only), so that resamplings onto
+    the same reference within a process (e.g., of the BOLD series, its reference and
+    its mask onto a standard space) compute them once, while holding a single grid.
+
+    Examples
+    --------
+    >>> grid_points(nb.Nifti1Image(np.zeros((2, 1, 1)), np.diag([2.0, 2.0, 2.0, 1.0])))
+    array([[0., 0., 0.],
+           [2., 0., 0.]], dtype=float32)
+    >>> img = nb.Nifti1Image(np.zeros((2, 1, 1)), np.eye(4))
+    >>> grid_points(img) is grid_points(nb.Nifti1Image(np.ones((2, 1, 1)), np.eye(4)))
+    True
+    >>> grid_points(img).flags.writeable
+    False
+
+    """
+    return _grid_points(tuple(img.shape[:3]), np.asarray(img.affine, dtype=float).tobytes())
+
+
+@lru_cache(maxsize=1)
+def _grid_points(shape, affine):
+    ijk = np.indices(shape, dtype=np.float32).reshape((3, -1)).T
+    points = apply_affine(np.frombuffer(affine).reshape((4, 4)), ijk)
+    points.flags.writeable = False
+    return points
+
+
+def apply_affine(matrix, points):
+    """
+    Apply an affine to points, preserving their data type.
+
+    Examples
+    --------
+    >>> apply_affine(np.diag([2.0, 2.0, 2.0, 1.0]), np.ones((1, 3), dtype=np.float32))
+    array([[2., 2., 2.]], dtype=float32)
+
+    """
+    matrix = matrix.astype(points.dtype)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def itk_affine(parameters, center):
+    """
+    Convert the parameters of an ITK affine transform into a RAS+ matrix.
+
+    ITK maps a point ``x`` (LPS+) to ``M (x - c) + t + c``.
+
+    Examples
+    --------
+    >>> itk_affine([1, 0, 0, 0, 1, 0, 0, 0, 1, 1, 2, 3], [0, 0, 0])
+    array([[ 1.,  0.,  0., -1.],
+           [ 0.,  1.,  0., -2.],
+           [ 0.,  0.,  1.,  3.],
+           [ 0.,  0.,  0.,  1.]])
+
+    """
+    parameters = np.asarray(parameters, dtype=float)
+    center = np.asarray(center, dtype=float)
+    matrix = np.eye(4)
+    matrix[:3, :3] = parameters[:9].reshape((3, 3))
+    matrix[:3, 3] = parameters[9:12] + center - matrix[:3, :3] @ center
+    return LPS @ matrix @ LPS
+
+
+def load_transform(filename):
+    """
+    Load an ITK transform file as a chain of elementary transforms.
+
+    Linear transforms are returned as arrays of shape ``(4, 4)``, or ``(T, 4, 4)``
+    when the file holds a series of transforms (e.g., head-motion parameters of every
+    volume), and nonlinear transforms as :class:`DisplacementsField` objects.
+    ``"identity"`` stands for the identity transform, and yields an empty chain.
+
+    """
+    filename = str(filename)
+    if filename == "identity":
+        return []
+    if filename.endswith(".h5"):
+        return _load_h5(filename)
+    if filename.endswith((".nii", ".nii.gz")):
+        return [_load_displacements(filename)]
+
+    from nitransforms.io.itk import ITKLinearTransform, ITKLinearTransformArray
+
+    if filename.endswith(".mat"):
+        return [ITKLinearTransform.from_filename(filename).to_ras()]
+
+    matrices = ITKLinearTransformArray.from_filename(filename).to_ras()
+    return [matrices[0] if len(matrices) == 1 else matrices]
+
+
+def load_transforms(filenames):
+    """Load a list of ITK transform files as a single chain of elementary transforms."""
+    return [xfm for filename in filenames for xfm in load_transform(filename)]
+
+
+def map_points(chain, points, index=0):
+    """
+    Map points through a chain of transforms.
+
+    Parameters
+    ----------
+    chain : :obj:`list`
+        Elementary transforms, as returned by :func:`load_transforms`.
+    points : :obj:`numpy.ndarray`
+        World coordinates, of shape ``(N, 3)``.
+    index : :obj:`int`
+        Picks the transform of series of linear transforms (e.g., the volume
+        of a head-motion corrected time series).
+
+    Examples
+    --------
+    >>> shift = np.eye(4)
+    >>> shift[:3, 3] = [0, 0, 1]
+    >>> flip = np.diag([-1.0, 1.0, 1.0, 1.0])
+    >>> map_points([shift, np.stack((flip, shift))], np.array([[1.0, 2.0, 3.0]]), index=1)
+    array([[1., 2., 5.]])
+
+    """
+    for xfm in chain:
+        if isinstance(xfm, DisplacementsField):
+            points = xfm.map(points)
+            continue
+        points = apply_affine(xfm[index] if xfm.ndim == 3 else xfm, points)
+    return points
+
+
+def to_displacements(chain, reference):
+    """
+    Compose a chain of transforms into an ITK displacements field.
+
+    The field is sampled on the grid of ``reference``, so that it holds the exact
+    composition of the chain at the voxels of that grid.
+
+    Examples
+    --------
+    >>> shift = np.eye(4)
+    >>> shift[:3, 3] = [1.0, 2.0, 3.0]
+    >>> field = to_displacements([shift], nb.Nifti1Image(np.zeros((2, 2, 2)), np.eye(4)))
+    >>> field.shape
+    (2, 2, 2, 1, 3)
+    >>> field.get_fdata()[0, 0, 0, 0]
+    array([-1., -2.,  3.])
+
+    """
+    points = grid_points(reference)
+    field = (map_points(chain, points) - points).reshape(reference.shape[:3] + (1, 3))
+    field[..., :2] *= -1.0
+
+    hdr = nb.Nifti1Header()
+    hdr.set_intent("vector")
+    hdr.set_data_dtype(np.float32)
+    return nb.Nifti1Image(field, reference.affine, hdr)
+
+
+def _load_displacements(filename):
+    """Load an ITK displacements field stored in NIfTI format (LPS+ vectors)."""
+    img = nb.load(filename)
+    if img.ndim != 5 or img.shape[3] != 1 or img.shape[4] != 3:
+        raise ValueError(f"{filename} is not an ITK displacements field")
+    field = np.asanyarray(img.dataobj, dtype=np.float32).reshape(img.shape[:3] + (3,))
+    field[..., :2] *= -1.0
+    return DisplacementsField(field, img.affine)
+
+
+def _load_h5(filename):
+    """Load an ITK transform in HDF5 format, possibly a composite transform."""
+    import h5py
+
+    chain = []
+    with h5py.File(filename, "r") as h5file:
+        group = h5file["TransformGroup"]
+        for key in sorted(group.keys(), key=int):
+            xfm = group[key]
+            kind = xfm["TransformType"][0]
+            kind = kind.decode() if isinstance(kind, bytes) else str(kind)
+            if kind.startswith("CompositeTransform"):
+                continue
+
+            parameters = np.asarray(xfm["TransformParameters"])
+            fixed = np.asarray(xfm["TransformFixedParameters"], dtype=float)
+            if kind.startswith("DisplacementFieldTransform"):
+                size = fixed[:3].astype(int)
+                affine = np.eye(4)
+                affine[:3, :3] = fixed[9:].reshape((3, 3)) * fixed[6:9]
+                affine[:3, 3] = fixed[3:6]
+                # Vectors are stored voxel-wise, with the first axis varying fastest
+                field = parameters.astype(np.float32).reshape(tuple(size[::-1]) + (3,))
+                field = field.transpose(2, 1, 0, 3)
+                field[..., :2] *= -1.0
+                chain.append(DisplacementsField(field, LPS @ affine))
+            elif "Affine" in kind or "MatrixOffset" in kind:
+                chain.append(itk_affine(parameters, fixed))
+            else:
+                raise NotImplementedError(f"Unsupported ITK transform type <{kind}>")
+
+    # ITK applies the transforms of a composite from the last one to the first one
+    return chain[::-1]
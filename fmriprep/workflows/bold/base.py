@@ -329,11 +329,22 @@ All resamplings can be performed with *a single interpolation
 step* by composing all the pertinent transformations (i.e. head-motion
 transform matrices, susceptibility distortion correction when available,
 and co-registrations to anatomical and output spaces).
-Gridded (volumetric) resamplings were performed using `antsApplyTransforms` (ANTs),
-configured with Lanczos interpolation to minimize the smoothing
+Gridded (volumetric) resamplings of the BOLD time-series, and resamplings
+of the BOLD reference (and of the T2\\* map, for multi-echo data) onto
+standard spaces, were performed with cubic B-spline interpolation (SciPy).
+Resamplings onto standard-space grids with voxels at least 90% the size of
+the original BOLD voxels used linear interpolation instead.
+Brain masks and segmentations were resampled onto standard spaces with
+nearest-neighbor interpolation.
+Other gridded resamplings (onto the T1w space) used `antsApplyTransforms`
+(ANTs), configured with multi-label interpolation for masks and segmentations,
+and with Lanczos interpolation for the T2\\* map to minimize the smoothing
 effects of other kernels [@lanczos].
-Non-gridded (surface) resamplings were performed using `mri_vol2surf`
-(FreeSurfer).
+Non-gridded (surface) resamplings averaged, at each vertex, trilinear
+samples of the BOLD time-series at six evenly spaced depths between the
+white and pial surfaces, and mapped them onto template surfaces by
+nearest-neighbor forward and reverse mapping on the spherical registrations
+(as FreeSurfer's `mri_vol2surf`).
 """
 
     inputnode = pe.Node(
@@ -496,11 +507,6 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
     # Select validated BOLD files (orientations checked or corrected)
     select_bold = pe.Node(niu.Select(), name="select_bold")
 
-    # Top-level BOLD splitter
-    bold_split = pe.Node(
-        FSLSplit(dimension="t"), name="bold_split", mem_gb=mem_gb["filesize"] * 3
-    )
-
     # HMC on the BOLD
     bold_hmc_wf = init_bold_hmc_wf(
         name="bold_hmc_wf", mem_gb=mem_gb["filesize"], omp_nthreads=omp_nthreads
@@ -558,8 +564,6 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
 
     # MULTI-ECHO EPI DATA #############################################
     if multiecho:  # instantiate relevant interfaces, imports
-        split_opt_comb = bold_split.clone(name="split_opt_comb")
-
         inputnode.inputs.bold_file = ref_file  # Replace reference w first echo
 
         join_echos = pe.JoinNode(
@@ -621,8 +625,6 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
                                 ("t1w_mask", "in_mask")]),
         # Select validated bold files per-echo
         (initial_boldref_wf, select_bold, [("outputnode.all_bold_files", "inlist")]),
-        # BOLD buffer has slice-time corrected if it was run, original otherwise
-        (boldbuffer, bold_split, [("bold_file", "in_file")]),
         # HMC
         (initial_boldref_wf, bold_hmc_wf, [
             ("outputnode.raw_ref_image", "inputnode.raw_ref_image"),
@@ -718,7 +720,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
         # fmt:off
         workflow.connect([
             (inputnode, func_derivatives_wf, [("bold_file", "inputnode.source_file")]),
-            (bold_split, bold_t1_trans_wf, [("out_files", "inputnode.bold_split")]),
+            (boldbuffer, bold_t1_trans_wf, [("bold_file", "inputnode.bold_file")]),
             (bold_hmc_wf, bold_t1_trans_wf, [("outputnode.xforms", "inputnode.hmc_xforms")]),
         ])
         # fmt:on
@@ -731,8 +733,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             ]),
             (join_echos, bold_t2s_wf, [("bold_files", "inputnode.bold_file")]),
             (join_echos, bold_final, [("bold_files", "bold_echos")]),
-            (bold_t2s_wf, split_opt_comb, [("outputnode.bold", "in_file")]),
-            (split_opt_comb, bold_t1_trans_wf, [("out_files", "inputnode.bold_split")]),
+            (bold_t2s_wf, bold_t1_trans_wf, [("outputnode.bold", "inputnode.bold_file")]),
             (bold_t2s_wf, bold_final, [("outputnode.bold", "bold"),
                                        ("outputnode.t2star_map", "t2star")]),
             (inputnode, t2s_reporting_wf, [("t1w_dseg", "inputnode.label_file")]),
@@ -812,6 +813,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             ]),
             (bold_final, bold_std_trans_wf, [
                 ("mask", "inputnode.bold_mask"),
+                ("boldref", "inputnode.bold_ref"),
                 ("t2star", "inputnode.t2star"),
             ]),
             (bold_reg_wf, bold_std_trans_wf, [
@@ -842,7 +844,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
         if not multiecho:
             # fmt:off
             workflow.connect([
-                (bold_split, bold_std_trans_wf, [("out_files", "inputnode.bold_split")]),
+                (boldbuffer, bold_std_trans_wf, [("bold_file", "inputnode.bold_file")]),
                 (bold_hmc_wf, bold_std_trans_wf, [
                     ("outputnode.xforms", "inputnode.hmc_xforms"),
                 ]),
@@ -851,7 +853,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
         else:
             # fmt:off
             workflow.connect([
-                (split_opt_comb, bold_std_trans_wf, [("out_files", "inputnode.bold_split")]),
+                (bold_t2s_wf, bold_std_trans_wf, [("outputnode.bold", "inputnode.bold_file")]),
                 (bold_std_trans_wf, outputnode, [("outputnode.t2star_std", "t2star_std")]),
             ])
             # fmt:on
@@ -955,7 +957,6 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             (inputnode, bold_surf_wf, [
                 ("subjects_dir", "inputnode.subjects_dir"),
                 ("subject_id", "inputnode.subject_id"),
-                ("t1w2fsnative_xfm", "inputnode.t1w2fsnative_xfm"),
                 ("anat_giftis", "inputnode.anat_giftis"),
                 ("t1w_mask", "inputnode.t1w_mask"),
             ]),
@@ -1092,7 +1093,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
         workflow.connect([
             # Connect bold_bold_trans_wf
             (bold_source, bold_bold_trans_wf, [("out", "inputnode.name_source")]),
-            (bold_split, bold_bold_trans_wf, [("out_files", "inputnode.bold_file")]),
+            (boldbuffer, bold_bold_trans_wf, [("bold_file", "inputnode.bold_file")]),
             (bold_hmc_wf, bold_bold_trans_wf, [
                 ("outputnode.xforms", "inputnode.hmc_xforms"),
             ]),
@@ -1132,6 +1133,11 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
     )
     unwarp_wf.inputs.inputnode.metadata = metadata
 
+    # Split the BOLD series only for SDC, which corrects it volume by volume
+    bold_split = pe.Node(
+        FSLSplit(dimension="t"), name="bold_split", mem_gb=mem_gb["filesize"] * 3
+    )
+
     output_select = pe.Node(
         KeySelect(fields=["fmap", "fmap_ref", "fmap_coeff", "fmap_mask", "sdc_method"]),
         name="output_select",
@@ -1188,6 +1194,8 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             ("outputnode.xforms", "inputnode.hmc_xforms")]),
         (initial_boldref_wf, sdc_report, [
             ("outputnode.ref_image", "before")]),
+        # BOLD buffer has slice-time corrected if it was run, original otherwise
+        (boldbuffer, bold_split, [("bold_file", "in_file")]),
         (bold_split, unwarp_wf, [
             ("out_files", "inputnode.distorted")]),
         (final_boldref_wf, sdc_report, [
@@ -246,8 +246,8 @@ def init_bold_t1_trans_wf(freesurfer, mem_gb, omp_nthreads, use_compression=True
     t1w_aparc
         FreeSurfer's ``aparc+aseg.mgz`` atlas projected into the T1w reference
         (only if ``recon-all`` was run).
-    bold_split
-        Individual 3D BOLD volumes, not motion corrected
+    bold_file
+        BOLD series, not motion corrected
     hmc_xforms
         List of affine transforms aligning each volume to ``ref_image`` in ITK format
     itk_bold_to_t1
@@ -276,20 +276,19 @@ def init_bold_t1_trans_wf(freesurfer, mem_gb, omp_nthreads, use_compression=True
       * :py:func:`~fmriprep.workflows.bold.registration.init_fsl_bbr_wf`
 
     """
-    from fmriprep.interfaces.maths import Clip
+    from fmriprep.interfaces.resampling import ResampleSeries
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.func.util import init_bold_reference_wf
     from niworkflows.interfaces.fixes import FixHeaderApplyTransforms as ApplyTransforms
-    from niworkflows.interfaces.itk import MultiApplyTransforms
-    from niworkflows.interfaces.nilearn import Merge
     from niworkflows.interfaces.nibabel import GenerateSamplingReference
+    from .resampling import _resample_series_mem_gb
 
     workflow = Workflow(name=name)
     inputnode = pe.Node(
         niu.IdentityInterface(
             fields=['name_source', 'ref_bold_brain', 'ref_bold_mask',
                     't1w_brain', 't1w_mask', 't1w_aseg', 't1w_aparc',
-                    'bold_split', 'fieldwarp', 'hmc_xforms',
+                    'bold_file', 'fieldwarp', 'hmc_xforms',
                     'itk_bold_to_t1']),
         name='inputnode'
     )
@@ -335,19 +334,14 @@ def init_bold_t1_trans_wf(freesurfer, mem_gb, omp_nthreads, use_compression=True
             (aparc_t1w_tfm, outputnode, [('output_image', 'bold_aparc_t1')]),
         ])
 
+    # Interpolation can occasionally produce below-zero values as an artifact,
+    # which are clipped by the resampler
     bold_to_t1w_transform = pe.Node(
-        MultiApplyTransforms(interpolation="LanczosWindowedSinc", float=True, copy_dtype=True),
-        name='bold_to_t1w_transform', mem_gb=mem_gb * 3 * omp_nthreads, n_procs=omp_nthreads)
-
-    # Interpolation can occasionally produce below-zero values as an artifact
-    threshold = pe.MapNode(
-        Clip(minimum=0),
-        name="threshold",
-        iterfield=['in_file'],
-        mem_gb=DEFAULT_MEMORY_MIN_GB)
-
-    # merge 3D volumes into 4D timeseries
-    merge = pe.Node(Merge(compress=use_compression), name='merge', mem_gb=mem_gb)
+        ResampleSeries(clip=True, copy_dtype=True, compress=use_compression,
+                       num_threads=omp_nthreads),
+        name='bold_to_t1w_transform', n_procs=omp_nthreads,
+        # The T1w grid extends over the field of view of the T1w image
+        mem_gb=_resample_series_mem_gb(mem_gb, omp_nthreads, grid_ratio=2.0))
 
     # Generate a reference on the target T1w space
     gen_final_ref = init_bold_reference_wf(omp_nthreads, pre_mask=True)
@@ -357,19 +351,17 @@ def init_bold_t1_trans_wf(freesurfer, mem_gb, omp_nthreads, use_compression=True
                            run_without_submitting=True, mem_gb=DEFAULT_MEMORY_MIN_GB)
 
     workflow.connect([
-        (inputnode, merge, [('name_source', 'header_source')]),
         (inputnode, merge_xforms, [
             ('hmc_xforms', 'in3'),  # May be 'identity' if HMC already applied
             ('fieldwarp', 'in2'),   # May be 'identity' if SDC already applied
             ('itk_bold_to_t1', 'in1')]),
-        (inputnode, bold_to_t1w_transform, [('bold_split', 'input_image')]),
+        (inputnode, bold_to_t1w_transform, [('bold_file', 'input_image'),
+                                            ('name_source', 'header_source')]),
         (merge_xforms, bold_to_t1w_transform, [('out', 'transforms')]),
         (gen_ref, bold_to_t1w_transform, [('out_file', 'reference_image')]),
-        (bold_to_t1w_transform, threshold, [('out_files', 'in_file')]),
-        (threshold, merge, [('out_file', 'in_files')]),
-        (merge, gen_final_ref, [('out_file', 'inputnode.bold_file')]),
+        (bold_to_t1w_transform, gen_final_ref, [('out_file', 'inputnode.bold_file')]),
         (mask_t1w_tfm, gen_final_ref, [('output_image', 'inputnode.bold_mask')]),
-        (merge, outputnode, [('out_file', 'bold_t1')]),
+        (bold_to_t1w_transform, outputnode, [('out_file', 'bold_t1')]),
         (gen_final_ref, outputnode, [('outputnode.ref_image', 'bold_t1_ref')]),
     ])
 
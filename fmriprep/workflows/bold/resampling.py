@@ -30,15 +30,26 @@ Resampling workflows
 
 """
 from ctypes import create_string_buffer
+from functools import lru_cache
 from ...config import DEFAULT_MEMORY_MIN_GB
 
 from nipype import Function
 from nipype.pipeline import engine as pe
-from nipype.interfaces import utility as niu, freesurfer as fs, fsl
+from nipype.interfaces import utility as niu, fsl
 import nipype.interfaces.workbench as wb
-from niworkflows.interfaces.fixes import FixHeaderApplyTransforms as ApplyTransforms
 from niworkflows.interfaces.freesurfer import MedialNaNs
-from ...interfaces.volume import CreateSignedDistanceVolume
+from niworkflows.utils.connections import pop_file
+from ...interfaces.maths import CovModulate, GoodVoxelsMask, MakeRibbon
+from ...interfaces.surf import VolumeToSurface
+from ...interfaces.volume import CreateSignedDistanceVolume, IdentityReslice
+
+# Spline orders approximating the interpolation types of ANTs
+_SPLINE_ORDERS = {
+    "NearestNeighbor": 0,
+    "Linear": 1,
+    "BSpline": 3,
+    "LanczosWindowedSinc": 3,
+}
 
 
 def init_bold_surf_wf(mem_gb,
@@ -90,8 +101,6 @@ def init_bold_surf_wf(mem_gb,
         FreeSurfer SUBJECTS_DIR
     subject_id
         FreeSurfer subject ID
-    t1w2fsnative_xfm
-        LTA-style affine matrix translating from T1w to FreeSurfer-conformed subject space
     anat_giftis
         GIFTI anatomical surfaces in T1w space
 
@@ -101,9 +110,7 @@ def init_bold_surf_wf(mem_gb,
         BOLD series, resampled to FreeSurfer surfaces
 
     """
-    from nipype.interfaces.io import FreeSurferSource
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
-    from niworkflows.interfaces.surf import GiftiSetAnatomicalStructure
 
     workflow = Workflow(name=name)
     workflow.__desc__ = """\
@@ -127,7 +134,6 @@ surface projection.
             fields=["source_file",
                     "subject_id",
                     "subjects_dir",
-                    "t1w2fsnative_xfm",
                     "anat_giftis",
                     "t1w_mask"]
         ),
@@ -137,10 +143,6 @@ surface projection.
     itersource = pe.Node(niu.IdentityInterface(fields=["target"]), name="itersource")
     itersource.iterables = [("target", surface_spaces)]
 
-    get_fsnative = pe.Node(
-        FreeSurferSource(), name="get_fsnative", run_without_submitting=True
-    )
-
     def select_target(subject_id, space):
         """Get the target subject ID, given a source subject ID and a target space."""
         return subject_id if space == "fsnative" else space
@@ -160,305 +162,78 @@ surface projection.
         mem_gb=DEFAULT_MEMORY_MIN_GB,
     )
 
-    itk2lta = pe.Node(
-        niu.Function(function=_itk2lta), name="itk2lta", run_without_submitting=True
-    )
-
-    sampler = pe.MapNode(
-        fs.SampleToSurface(
-            cortex_mask=True,
-            interp_method="trilinear",
-            out_type="gii",
-            override_reg_subj=True,
-            sampling_method="average",
-            sampling_range=(0, 1, 0.2),
-            sampling_units="frac",
-        ),
-        name_source=['source_file'],
-        keep_extension=False,
-        iterfield=["hemi"],
+    # The sampler holds the whole BOLD series in memory, along with the sampled
+    # series of both hemispheres
+    sampler = pe.Node(
+        VolumeToSurface(),
         name="sampler",
         mem_gb=mem_gb * 3,
     )
-    sampler.inputs.hemi = ["lh", "rh"]
 
     # Refine if medial vertices should be NaNs
     medial_nans = pe.MapNode(
         MedialNaNs(), iterfield=["in_file"], name="medial_nans", mem_gb=DEFAULT_MEMORY_MIN_GB
     )
 
-    update_metadata = pe.MapNode(
-        GiftiSetAnatomicalStructure(),
-        iterfield=["in_file"],
-        name="update_metadata",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
     outputnode = pe.JoinNode(
         niu.IdentityInterface(fields=["surfaces", "target"]),
         joinsource="itersource",
         name="outputnode",
     )
 
-    # 0, 1 = wm; 2, 3 = pial; 6, 7 = mid
+    # anat_giftis: 0, 1 = wm; 2, 3 = pial; 6, 7 = mid
     # note that order of lh / rh within each surf type is not guaranteed due to use
-    # of unsorted glob by FreeSurferSource prior, but we can do a sort with
-    # _sorted_by_basename to ensure consistent ordering
-    select_wm = pe.Node(
-        niu.Select(index=[0, 1]),
-        name="select_wm",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    select_pial = pe.Node(
-        niu.Select(index=[2, 3]),
-        name="select_pial",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    select_midthick = pe.Node(
-        niu.Select(index=[6, 7]),
-        name="select_midthick",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    create_wm_distvol = pe.MapNode(
-        CreateSignedDistanceVolume(),
+    # of unsorted glob by FreeSurferSource prior, so the surfaces are picked out
+    # and sorted by the _sorted_wm, _sorted_pial and _sorted_wm_pial connection
+    # functions to ensure consistent ordering
+
+    # The ribbon only depends on the sign of the distance of voxels lying between
+    # the white and pial surfaces, which are at most ~5mm apart. Limiting the
+    # approximate distance calculation to 10mm avoids propagating distances
+    # through most of the volume.
+    create_distvols = pe.MapNode(
+        CreateSignedDistanceVolume(approx_limit=10.0),
         iterfield=["surface"],
-        name="create_wm_distvol",
+        name="create_distvols",
         mem_gb=mem_gb,
     )
 
-    create_pial_distvol = pe.MapNode(
-        CreateSignedDistanceVolume(),
-        iterfield=["surface"],
-        name="create_pial_distvol",
+    make_ribbon = pe.Node(
+        MakeRibbon(),
+        name="make_ribbon",
         mem_gb=mem_gb,
     )
 
-    thresh_wm_distvol = pe.MapNode(
-        fsl.maths.MathsCommand(args="-thr 0 -bin -mul 255"),
-        iterfield=["in_file"],
-        name="thresh_wm_distvol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    uthresh_pial_distvol = pe.MapNode(
-        fsl.maths.MathsCommand(args="-uthr 0 -abs -bin -mul 255"),
-        iterfield=["in_file"],
-        name="uthresh_pial_distvol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    bin_wm_distvol = pe.MapNode(
-        fsl.maths.UnaryMaths(operation="bin"),
-        iterfield=["in_file"],
-        name="bin_wm_distvol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    bin_pial_distvol = pe.MapNode(
-        fsl.maths.UnaryMaths(operation="bin"),
-        iterfield=["in_file"],
-        name="bin_pial_distvol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    split_wm_distvol = pe.Node(
-        niu.Split(splits=[1, 1]),
-        name="split_wm_distvol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_wm_distvol_no_flatten = pe.Node(
-        niu.Merge(2),
-        no_flatten=True,
-        name="merge_wm_distvol_no_flatten",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    make_ribbon_vol = pe.MapNode(
-        fsl.maths.MultiImageMaths(op_string="-mas %s -mul 255 "),
-        iterfield=["in_file", "operand_files"],
-        name="make_ribbon_vol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    bin_ribbon_vol = pe.MapNode(
-        fsl.maths.UnaryMaths(operation="bin"),
-        iterfield=["in_file"],
-        name="bin_ribbon_vol",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    split_squeeze_ribbon_vol = pe.Node(
-        niu.Split(splits=[1, 1], squeeze=True),
-        name="split_squeeze_ribbon",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    combine_ribbon_vol_hemis = pe.Node(
-        fsl.maths.BinaryMaths(operation="add"),
-        name="combine_ribbon_vol_hemis",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
     ribbon_boldsrc_xfm = pe.Node(
-        ApplyTransforms(interpolation='MultiLabel',
-                        transforms='identity'),
+        IdentityReslice(),
         name="ribbon_boldsrc_xfm",
         mem_gb=mem_gb,
     )
 
-    stdev_volume = pe.Node(
-        fsl.maths.StdImage(dimension='T'),
-        name="stdev_volume",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mean_volume = pe.Node(
-        fsl.maths.MeanImage(dimension='T'),
-        name="mean_volume",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_volume = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name="cov_volume",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon = pe.Node(
-        fsl.ApplyMask(),
-        name="cov_ribbon",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_mean = pe.Node(
-        fsl.ImageStats(op_string='-M '),
-        name="cov_ribbon_mean",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_std = pe.Node(
-        fsl.ImageStats(op_string='-S '),
-        name="cov_ribbon_std",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_norm = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name="cov_ribbon_norm",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    smooth_norm = pe.Node(
-        fsl.maths.MathsCommand(args="-bin -s 5 "),
-        name="smooth_norm",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_smooth_norm = pe.Node(
-        niu.Merge(1),
-        name="merge_smooth_norm",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_norm_smooth = pe.Node(
-        fsl.maths.MultiImageMaths(op_string='-s 5 -div %s -dilD '),
-        name="cov_ribbon_norm_smooth",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name="cov_norm",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm_modulate = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name="cov_norm_modulate",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm_modulate_ribbon = pe.Node(
-        fsl.ApplyMask(),
-        name="cov_norm_modulate_ribbon",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
+    # Intermediate volumes of the ribbon and goodvoxels masks never leave the
+    # working directory, so they are written uncompressed
+    cov_modulate = pe.Node(
+        CovModulate(),
+        name="cov_modulate",
+        mem_gb=mem_gb,
     )
 
-    def _calc_upper_thr(in_stats):
-        return in_stats[0] + (in_stats[1] * 0.5)
+    def _calc_upper_thr(mean, std):
+        return mean + (std * 0.5)
 
     upper_thr_val = pe.Node(
         Function(
-            input_names=["in_stats"],
+            input_names=["mean", "std"],
             output_names=["upper_thresh"],
             function=_calc_upper_thr
         ),
         name="upper_thr_val",
+        run_without_submitting=True,
         mem_gb=DEFAULT_MEMORY_MIN_GB,
     )
 
-    def _calc_lower_thr(in_stats):
-        return in_stats[1] - (in_stats[0] * 0.5)
-
-    lower_thr_val = pe.Node(
-        Function(
-            input_names=["in_stats"],
-            output_names=["lower_thresh"],
-            function=_calc_lower_thr
-        ),
-        name="lower_thr_val",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mod_ribbon_mean = pe.Node(
-        fsl.ImageStats(op_string='-M '),
-        name="mod_ribbon_mean",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mod_ribbon_std = pe.Node(
-        fsl.ImageStats(op_string='-S '),
-        name="mod_ribbon_std",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_mod_ribbon_stats = pe.Node(
-        niu.Merge(2),
-        name="merge_mod_ribbon_stats",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    bin_mean_volume = pe.Node(
-        fsl.maths.UnaryMaths(operation="bin"),
-        name="bin_mean_volume",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_goodvoxels_operands = pe.Node(
-        niu.Merge(2),
-        name="merge_goodvoxels_operands",
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    goodvoxels_thr = pe.Node(
-        fsl.maths.Threshold(),
-        name="goodvoxels_thr",
-        mem_gb=mem_gb,
-    )
-
-    goodvoxels_mask = pe.Node(
-        fsl.maths.MultiImageMaths(op_string='-bin -sub %s -mul -1 '),
-        name="goodvoxels_mask",
-        mem_gb=mem_gb,
-    )
-    
     goodvoxels_ribbon_mask = pe.Node(
-        fsl.ApplyMask(),
-        name_source=['in_file'],
+        GoodVoxelsMask(),
         name="goodvoxels_ribbon_mask",
         mem_gb=DEFAULT_MEMORY_MIN_GB,
     )
@@ -470,148 +245,69 @@ surface projection.
         mem_gb=mem_gb * 3,
     )
 
-    if not project_goodvoxels:
-        # fmt: off
-        workflow.connect([
-            (inputnode, get_fsnative, [('subject_id', 'subject_id'),
-                                       ('subjects_dir', 'subjects_dir')]),
-            (inputnode, targets, [('subject_id', 'subject_id')]),
-            (inputnode, rename_src, [('source_file', 'in_file')]),
-            (inputnode, itk2lta, [('source_file', 'src_file'),
-                                  ('t1w2fsnative_xfm', 'in_file')]),
-            (get_fsnative, itk2lta, [("T1", "dst_file")]),
-            (inputnode, sampler, [('subjects_dir', 'subjects_dir'),
-                                  ('subject_id', 'subject_id')]),
-            (itersource, targets, [('target', 'space')]),
-            (itersource, rename_src, [('target', 'subject')]),
-            (itk2lta, sampler, [('out', 'reg_file')]),
-            (targets, sampler, [('out', 'target_subject')]),
-            (rename_src, sampler, [('out_file', 'source_file')]),
-            (update_metadata, outputnode, [('out_file', 'surfaces')]),
-            (itersource, outputnode, [('target', 'target')]),
-        ])
-        # fmt: on
-
-        if not medial_surface_nan:
-            workflow.connect(sampler, "out_file", update_metadata, "in_file")
-            return workflow
-
-        # fmt: off
-        workflow.connect([
-            (inputnode, medial_nans, [('subjects_dir', 'subjects_dir')]),
-            (sampler, medial_nans, [('out_file', 'in_file')]),
-            (medial_nans, update_metadata, [('out_file', 'in_file')]),
-        ])
-        # fmt: on
-        return workflow
-
-    # make HCP-style ribbon volume in T1w space
-    workflow.connect([
-        (inputnode, select_wm, [("anat_giftis", "inlist")]),
-        (inputnode, select_pial, [("anat_giftis", "inlist")]),
-        (inputnode, select_midthick, [("anat_giftis", "inlist")]),
-        (select_wm, create_wm_distvol, [(("out", _sorted_by_basename), "surface")]),
-        (inputnode, create_wm_distvol, [("t1w_mask", "ref_space")]),
-        (select_pial, create_pial_distvol, [(("out", _sorted_by_basename), "surface")]),
-        (inputnode, create_pial_distvol, [("t1w_mask", "ref_space")]),
-        (create_wm_distvol, thresh_wm_distvol, [("out_vol", "in_file")]),
-        (create_pial_distvol, uthresh_pial_distvol, [("out_vol", "in_file")]),
-        (thresh_wm_distvol, bin_wm_distvol, [("out_file", "in_file")]),
-        (uthresh_pial_distvol, bin_pial_distvol, [("out_file", "in_file")]),   
-        (bin_wm_distvol, split_wm_distvol, [("out_file", "inlist")]),
-        (split_wm_distvol, merge_wm_distvol_no_flatten, [("out1", "in1")]),
-        (split_wm_distvol, merge_wm_distvol_no_flatten, [("out2", "in2")]),
-        (bin_pial_distvol, make_ribbon_vol, [("out_file", "in_file")]),
-        (merge_wm_distvol_no_flatten, make_ribbon_vol, [("out", "operand_files")]),
-        (make_ribbon_vol, bin_ribbon_vol, [("out_file", "in_file")]),
-        (bin_ribbon_vol, split_squeeze_ribbon_vol, [("out_file", "inlist")]),
-        (split_squeeze_ribbon_vol, combine_ribbon_vol_hemis, [("out1", "in_file")]),
-        (split_squeeze_ribbon_vol, combine_ribbon_vol_hemis, [("out2", "operand_file")]),
-    ])
-
-    # make HCP-style "goodvoxels" mask in t1w space for filtering outlier voxels
-    # in bold timeseries, based on modulated normalized covariance
+    # fmt: off
     workflow.connect([
-        (combine_ribbon_vol_hemis, ribbon_boldsrc_xfm, [("out_file", 'input_image')]),
-        (rename_src, stdev_volume, [("out_file", "in_file")]),
-        (rename_src, mean_volume, [("out_file", "in_file")]),
-        (mean_volume, ribbon_boldsrc_xfm, [('out_file', 'reference_image')]),
-        (stdev_volume, cov_volume, [("out_file", "in_file")]),
-        (mean_volume, cov_volume, [("out_file", "operand_file")]),
-        (cov_volume, cov_ribbon, [("out_file", "in_file")]),
-        (ribbon_boldsrc_xfm, cov_ribbon, [("output_image", "mask_file")]),
-        (cov_ribbon, cov_ribbon_mean, [("out_file", "in_file")]),
-        (cov_ribbon, cov_ribbon_std, [("out_file", "in_file")]),
-        (cov_ribbon, cov_ribbon_norm, [("out_file", "in_file")]),
-        (cov_ribbon_mean, cov_ribbon_norm, [("out_stat", "operand_value")]),
-        (cov_ribbon_norm, smooth_norm, [("out_file", "in_file")]),
-        (smooth_norm, merge_smooth_norm, [("out_file", "in1")]),
-        (cov_ribbon_norm, cov_ribbon_norm_smooth, [("out_file", "in_file")]),
-        (merge_smooth_norm, cov_ribbon_norm_smooth, [("out", "operand_files")]),
-        (cov_ribbon_mean, cov_norm, [("out_stat", "operand_value")]),
-        (cov_volume, cov_norm, [("out_file", "in_file")]),
-        (cov_norm, cov_norm_modulate, [("out_file", "in_file")]),
-        (cov_ribbon_norm_smooth, cov_norm_modulate, [("out_file", "operand_file")]),
-        (cov_norm_modulate, cov_norm_modulate_ribbon, [("out_file", "in_file")]),
-        (ribbon_boldsrc_xfm, cov_norm_modulate_ribbon, [("output_image", "mask_file")]),
-        (cov_norm_modulate_ribbon, mod_ribbon_mean, [("out_file", "in_file")]),
-        (cov_norm_modulate_ribbon, mod_ribbon_std, [("out_file", "in_file")]),
-        (mod_ribbon_mean, merge_mod_ribbon_stats, [("out_stat", "in1")]),
-        (mod_ribbon_std, merge_mod_ribbon_stats, [("out_stat", "in2")]),
-        (merge_mod_ribbon_stats, upper_thr_val, [("out", "in_stats")]),
-        (merge_mod_ribbon_stats, lower_thr_val, [("out", "in_stats")]),
-        (mean_volume, bin_mean_volume, [("out_file", "in_file")]),
-        (upper_thr_val, goodvoxels_thr, [("upper_thresh", "thresh")]),
-        (cov_norm_modulate, goodvoxels_thr, [("out_file", "in_file")]),
-        (bin_mean_volume, merge_goodvoxels_operands, [("out_file", "in1")]),
-        (goodvoxels_thr, goodvoxels_mask, [("out_file", "in_file")]),
-        (merge_goodvoxels_operands, goodvoxels_mask, [("out", "operand_files")]),
-    ])
-
-    # apply goodvoxels ribbon mask to bold
-    workflow.connect([
-        (goodvoxels_mask, goodvoxels_ribbon_mask, [("out_file", "in_file")]),
-        (ribbon_boldsrc_xfm, goodvoxels_ribbon_mask, [("output_image", "mask_file")]),
-        (goodvoxels_ribbon_mask, apply_goodvoxels_ribbon_mask, [("out_file", "mask_file")]),
-        (rename_src, apply_goodvoxels_ribbon_mask, [("out_file", "in_file")]),
-    ])
-
-    # project masked bold to target surfs
-    workflow.connect([
-        (inputnode, get_fsnative, [("subject_id", "subject_id"),
-                                   ("subjects_dir", "subjects_dir")]),
         (inputnode, targets, [("subject_id", "subject_id")]),
-        (inputnode, rename_src, [("source_file", "in_file")]),
-        (inputnode, itk2lta, [("source_file", "src_file"),
-                              ("t1w2fsnative_xfm", "in_file")]),
-        (get_fsnative, itk2lta, [("T1", "dst_file")]),
         (inputnode, sampler, [("subjects_dir", "subjects_dir"),
-                              ("subject_id", "subject_id")]),
+                              ("subject_id", "subject_id"),
+                              (("anat_giftis", _sorted_wm), "white_surfs"),
+                              (("anat_giftis", _sorted_pial), "pial_surfs")]),
         (itersource, targets, [("target", "space")]),
         (itersource, rename_src, [("target", "subject")]),
-        (itk2lta, sampler, [("out", "reg_file")]),
         (targets, sampler, [("out", "target_subject")]),
-        (apply_goodvoxels_ribbon_mask, sampler, [("out_file", "source_file")]),
-        (update_metadata, outputnode, [("out_file", "surfaces")]),
+        (rename_src, sampler, [("out_file", "in_file")]),
         (itersource, outputnode, [("target", "target")]),
     ])
+    # fmt: on
 
-    # fmt:on
-    if not medial_surface_nan:
-        # fmt:off
+    if not project_goodvoxels:
+        workflow.connect(inputnode, "source_file", rename_src, "in_file")
+    else:
+        # fmt: off
+        # make HCP-style ribbon volume in T1w space
         workflow.connect([
-            (sampler, update_metadata, [("out_file", "in_file")]),
+            (inputnode, create_distvols, [(("anat_giftis", _sorted_wm_pial), "surface"),
+                                          ("t1w_mask", "ref_space")]),
+            (create_distvols, make_ribbon, [(("out_vol", _wm_pair), "white_distvols"),
+                                            (("out_vol", _pial_pair), "pial_distvols")]),
         ])
-        # fmt:on
+
+        # make HCP-style "goodvoxels" mask in t1w space for filtering outlier voxels
+        # in bold timeseries, based on modulated normalized covariance.
+        # None of this depends on the target space, so it is kept upstream of
+        # itersource and runs once, rather than once per surface space.
+        workflow.connect([
+            (make_ribbon, ribbon_boldsrc_xfm, [("ribbon", "input_image")]),
+            (inputnode, ribbon_boldsrc_xfm, [("source_file", "reference_image")]),
+            (inputnode, cov_modulate, [("source_file", "in_file")]),
+            (ribbon_boldsrc_xfm, cov_modulate, [("output_image", "mask_file")]),
+            (cov_modulate, upper_thr_val, [("ribbon_mean", "mean"),
+                                           ("ribbon_std", "std")]),
+            (upper_thr_val, goodvoxels_ribbon_mask, [("upper_thresh", "threshold")]),
+            (cov_modulate, goodvoxels_ribbon_mask, [("out_file", "in_file"),
+                                                    ("mean_file", "mean_file")]),
+            (ribbon_boldsrc_xfm, goodvoxels_ribbon_mask, [("output_image", "mask_file")]),
+        ])
+
+        # apply goodvoxels ribbon mask to bold and project masked bold to target surfs
+        workflow.connect([
+            (goodvoxels_ribbon_mask, apply_goodvoxels_ribbon_mask, [("out_file", "mask_file")]),
+            (inputnode, apply_goodvoxels_ribbon_mask, [("source_file", "in_file")]),
+            (apply_goodvoxels_ribbon_mask, rename_src, [("out_file", "in_file")]),
+        ])
+        # fmt: on
+
+    if not medial_surface_nan:
+        workflow.connect(sampler, "out_files", outputnode, "surfaces")
         return workflow
 
-    # fmt:off
+    # fmt: off
     workflow.connect([
-        (inputnode, medial_nans, [('subjects_dir', 'subjects_dir')]),
-        (sampler, medial_nans, [("out_file", "in_file")]),
-        (medial_nans, update_metadata, [("out_file", "in_file")]),
+        (inputnode, medial_nans, [("subjects_dir", "subjects_dir")]),
+        (sampler, medial_nans, [("out_files", "in_file")]),
+        (medial_nans, outputnode, [("out_file", "surfaces")]),
     ])
-    # fmt:on
+    # fmt: on
     return workflow
 
 
@@ -687,8 +383,10 @@ def init_bold_std_trans_wf(
         (only if ``recon-all`` was run).
     bold_mask
         Skull-stripping mask of reference image
-    bold_split
-        Individual 3D volumes, not motion corrected
+    bold_file
+        BOLD series, not motion corrected
+    bold_ref
+        Reference image of the BOLD series, after all corrections (native space)
     t2star
         Estimated T2\\* map in BOLD native space
     fieldwarp
@@ -725,14 +423,12 @@ def init_bold_std_trans_wf(
         described outputs.
 
     """
-    from fmriprep.interfaces.maths import Clip
+    from fmriprep.interfaces.resampling import (
+        ComposeTransforms, ResampleLabels, ResampleSeries
+    )
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
-    from niworkflows.func.util import init_bold_reference_wf
-    from niworkflows.interfaces.fixes import FixHeaderApplyTransforms as ApplyTransforms
-    from niworkflows.interfaces.itk import MultiApplyTransforms
     from niworkflows.interfaces.utility import KeySelect
     from niworkflows.interfaces.nibabel import GenerateSamplingReference
-    from niworkflows.interfaces.nilearn import Merge
     from niworkflows.utils.spaces import format_reference
 
     workflow = Workflow(name=name)
@@ -764,7 +460,8 @@ preprocessed BOLD runs*: {tpl}.
                 "bold_aparc",
                 "bold_aseg",
                 "bold_mask",
-                "bold_split",
+                "bold_file",
+                "bold_ref",
                 "t2star",
                 "fieldwarp",
                 "hmc_xforms",
@@ -777,19 +474,24 @@ preprocessed BOLD runs*: {tpl}.
     )
 
     iterablesource = pe.Node(
-        niu.IdentityInterface(fields=["std_target"]), name="iterablesource"
-    )
-    # Generate conversions for every template+spec at the input
-    iterablesource.iterables = [("std_target", std_vol_references)]
+        niu.IdentityInterface(fields=["std_target", "space", "keep_native"]),
+        name="iterablesource",
+    )
+    # Generate conversions for every template+spec at the input. The space name
+    # and the sampling options of each target are resolved here, once, rather
+    # than by a node of each expansion
+    iterablesource.synchronize = True
+    iterablesource.iterables = [
+        ("std_target", std_vol_references),
+        ("space", [space for space, _ in std_vol_references]),
+        ("keep_native", [_is_native(spec) for _, spec in std_vol_references]),
+    ]
 
-    split_target = pe.Node(
-        niu.Function(
-            function=_split_spec,
-            input_names=["in_target"],
-            output_names=["space", "template", "spec"],
-        ),
+    # Templates are looked up at run time, as they may have to be fetched
+    select_tpl = pe.Node(
+        niu.Function(function=_select_template),
+        name="select_tpl",
         run_without_submitting=True,
-        name="split_target",
     )
 
     select_std = pe.Node(
@@ -798,20 +500,18 @@ preprocessed BOLD runs*: {tpl}.
         run_without_submitting=True,
     )
 
-    select_tpl = pe.Node(
-        niu.Function(function=_select_template),
-        name="select_tpl",
-        run_without_submitting=True,
-    )
-
     gen_ref = pe.Node(
         GenerateSamplingReference(), name="gen_ref", mem_gb=0.3
     )  # 256x256x256 * 64 / 8 ~ 150MB)
 
-    mask_std_tfm = pe.Node(
-        ApplyTransforms(interpolation="MultiLabel"), name="mask_std_tfm", mem_gb=1
+    # Decode the anatomical-to-standard transform once, into a displacements field
+    # on the reference grid that all the resamplings below share
+    anat2std_field = pe.Node(
+        ComposeTransforms(), name="anat2std_field", mem_gb=1
     )
 
+    mask_std_tfm = pe.Node(ResampleLabels(), name="mask_std_tfm", mem_gb=1)
+
     # Write corrected file in the designated output dir
     mask_merge_tfms = pe.Node(
         niu.Merge(2),
@@ -827,53 +527,70 @@ preprocessed BOLD runs*: {tpl}.
         mem_gb=DEFAULT_MEMORY_MIN_GB,
     )
 
+    # Interpolate linearly unless the BOLD series is upsampled
+    select_interp = pe.Node(
+        niu.Function(
+            function=_select_interpolation,
+            output_names=["order"],
+        ),
+        name="select_interp",
+        run_without_submitting=True,
+    )
+
+    # Interpolation can occasionally produce below-zero values as an artifact,
+    # which are clipped by the resampler
     bold_to_std_transform = pe.Node(
-        MultiApplyTransforms(
-            interpolation="LanczosWindowedSinc", float=True, copy_dtype=True
+        ResampleSeries(
+            clip=True,
+            copy_dtype=True,
+            compress=use_compression,
+            num_threads=omp_nthreads,
         ),
         name="bold_to_std_transform",
-        mem_gb=mem_gb * 3 * omp_nthreads,
+        # Standard-space grids may have several times as many voxels as the BOLD
+        # (e.g., 2mm templates for BOLD series acquired with 3mm voxels)
+        mem_gb=_resample_series_mem_gb(mem_gb, omp_nthreads, grid_ratio=4.0),
         n_procs=omp_nthreads,
     )
 
-    # Interpolation can occasionally produce below-zero values as an artifact
-    threshold = pe.MapNode(
-        Clip(minimum=0),
-        name="threshold",
-        iterfield=['in_file'],
-        mem_gb=DEFAULT_MEMORY_MIN_GB)
-
-    merge = pe.Node(Merge(compress=use_compression), name="merge", mem_gb=mem_gb * 3)
-
-    # Generate a reference on the target standard space
-    gen_final_ref = init_bold_reference_wf(omp_nthreads=omp_nthreads, pre_mask=True)
+    # Bring the native reference to the target standard space, rather than
+    # estimating (and skull-stripping) it again from the resampled series
+    boldref_std_tfm = pe.Node(
+        ResampleSeries(clip=True, compress=use_compression),
+        name="boldref_std_tfm",
+        mem_gb=1,
+    )
     # fmt:off
     workflow.connect([
-        (iterablesource, split_target, [("std_target", "in_target")]),
+        (iterablesource, select_std, [("space", "key")]),
         (iterablesource, select_tpl, [("std_target", "template")]),
+        (iterablesource, gen_ref, [("keep_native", "keep_native")]),
+        (select_tpl, gen_ref, [("out", "fixed_image")]),
         (inputnode, select_std, [("anat2std_xfm", "anat2std_xfm"),
                                  ("templates", "keys")]),
-        (inputnode, mask_std_tfm, [("bold_mask", "input_image")]),
-        (inputnode, gen_ref, [(("bold_split", _first), "moving_image")]),
+        (inputnode, mask_std_tfm, [("bold_mask", "in_files")]),
+        (inputnode, gen_ref, [("bold_file", "moving_image")]),
+        (inputnode, select_interp, [("bold_file", "moving")]),
         (inputnode, merge_xforms, [("hmc_xforms", "in4"),
                                    ("fieldwarp", "in3"),
                                    (("itk_bold_to_t1", _aslist), "in2")]),
-        (inputnode, merge, [("name_source", "header_source")]),
         (inputnode, mask_merge_tfms, [(("itk_bold_to_t1", _aslist), "in2")]),
-        (inputnode, bold_to_std_transform, [("bold_split", "input_image")]),
-        (split_target, select_std, [("space", "key")]),
-        (select_std, merge_xforms, [("anat2std_xfm", "in1")]),
-        (select_std, mask_merge_tfms, [("anat2std_xfm", "in1")]),
-        (split_target, gen_ref, [(("spec", _is_native), "keep_native")]),
-        (select_tpl, gen_ref, [("out", "fixed_image")]),
+        (inputnode, bold_to_std_transform, [("bold_file", "input_image"),
+                                            ("name_source", "header_source")]),
+        (select_std, anat2std_field, [("anat2std_xfm", "transforms")]),
+        (gen_ref, anat2std_field, [("out_file", "reference_image")]),
+        (anat2std_field, merge_xforms, [("out_file", "in1")]),
+        (anat2std_field, mask_merge_tfms, [("out_file", "in1")]),
         (merge_xforms, bold_to_std_transform, [("out", "transforms")]),
         (gen_ref, bold_to_std_transform, [("out_file", "reference_image")]),
+        (gen_ref, select_interp, [("out_file", "reference")]),
+        (select_interp, bold_to_std_transform, [("order", "order")]),
         (gen_ref, mask_std_tfm, [("out_file", "reference_image")]),
         (mask_merge_tfms, mask_std_tfm, [("out", "transforms")]),
-        (mask_std_tfm, gen_final_ref, [("output_image", "inputnode.bold_mask")]),
-        (bold_to_std_transform, threshold, [("out_files", "in_file")]),
-        (threshold, merge, [("out_file", "in_files")]),
-        (merge, gen_final_ref, [("out_file", "inputnode.bold_file")]),
+        (inputnode, boldref_std_tfm, [("bold_ref", "input_image")]),
+        (mask_merge_tfms, boldref_std_tfm, [("out", "transforms")]),
+        (gen_ref, boldref_std_tfm, [("out_file", "reference_image")]),
+        (select_interp, boldref_std_tfm, [("order", "order")]),
     ])
     # fmt:on
 
@@ -897,56 +614,48 @@ preprocessed BOLD runs*: {tpl}.
         # Connecting outputnode
         (iterablesource, poutputnode, [
             (("std_target", format_reference), "spatial_reference")]),
-        (merge, poutputnode, [("out_file", "bold_std")]),
-        (gen_final_ref, poutputnode, [("outputnode.ref_image", "bold_std_ref")]),
-        (mask_std_tfm, poutputnode, [("output_image", "bold_mask_std")]),
+        (bold_to_std_transform, poutputnode, [("out_file", "bold_std")]),
+        (boldref_std_tfm, poutputnode, [("out_file", "bold_std_ref")]),
+        (mask_std_tfm, poutputnode, [(("out_files", pop_file), "bold_mask_std")]),
         (select_std, poutputnode, [("key", "template")]),
     ])
     # fmt:on
 
     if freesurfer:
-        # Sample the parcellation files to functional space
-        aseg_std_tfm = pe.Node(
-            ApplyTransforms(interpolation="MultiLabel"), name="aseg_std_tfm", mem_gb=1
-        )
-        aparc_std_tfm = pe.Node(
-            ApplyTransforms(interpolation="MultiLabel"), name="aparc_std_tfm", mem_gb=1
+        # Sample the parcellation files to functional space, together
+        merge_labels = pe.Node(
+            niu.Merge(2),
+            name="merge_labels",
+            run_without_submitting=True,
+            mem_gb=DEFAULT_MEMORY_MIN_GB,
         )
+        labels_std_tfm = pe.Node(ResampleLabels(), name="labels_std_tfm", mem_gb=1)
         # fmt:off
         workflow.connect([
-            (inputnode, aseg_std_tfm, [("bold_aseg", "input_image")]),
-            (inputnode, aparc_std_tfm, [("bold_aparc", "input_image")]),
-            (select_std, aseg_std_tfm, [("anat2std_xfm", "transforms")]),
-            (select_std, aparc_std_tfm, [("anat2std_xfm", "transforms")]),
-            (gen_ref, aseg_std_tfm, [("out_file", "reference_image")]),
-            (gen_ref, aparc_std_tfm, [("out_file", "reference_image")]),
-            (aseg_std_tfm, poutputnode, [("output_image", "bold_aseg_std")]),
-            (aparc_std_tfm, poutputnode, [("output_image", "bold_aparc_std")]),
+            (inputnode, merge_labels, [("bold_aseg", "in1"),
+                                       ("bold_aparc", "in2")]),
+            (merge_labels, labels_std_tfm, [("out", "in_files")]),
+            (anat2std_field, labels_std_tfm, [("out_file", "transforms")]),
+            (gen_ref, labels_std_tfm, [("out_file", "reference_image")]),
+            (labels_std_tfm, poutputnode, [(("out_files", _first), "bold_aseg_std"),
+                                           (("out_files", _last), "bold_aparc_std")]),
         ])
         # fmt:on
 
     if multiecho:
-        t2star_merge_xforms = pe.Node(
-            niu.Merge(2),
-            name="merge_xforms",
-            run_without_submitting=True,
-            mem_gb=DEFAULT_MEMORY_MIN_GB,
-        )
-
+        # The T2* map shares the transforms of the BOLD mask and reference
         t2star_std_tfm = pe.Node(
-            MultiApplyTransforms(
-                interpolation="LanczosWindowedSinc", float=True
-            ),
-            name="t2star_std_tfm", mem_gb=1
+            ResampleSeries(clip=False, compress=use_compression),
+            name="t2star_std_tfm",
+            mem_gb=1,
         )
         # fmt:off
         workflow.connect([
-            (inputnode, t2star_merge_xforms, [(("itk_bold_to_t1", _aslist), "in2")]),
-            (select_std, t2star_merge_xforms, [("anat2std_xfm", "in1")]),
             (inputnode, t2star_std_tfm, [("t2star", "input_image")]),
-            (t2star_merge_xforms, t2star_std_tfm, [("out", "transforms")]),
+            (mask_merge_tfms, t2star_std_tfm, [("out", "transforms")]),
             (gen_ref, t2star_std_tfm, [("out_file", "reference_image")]),
-            (t2star_std_tfm, poutputnode, [("output_image", "t2star_std")]),
+            (select_interp, t2star_std_tfm, [("order", "order")]),
+            (t2star_std_tfm, poutputnode, [("out_file", "t2star_std")]),
         ])
         # fmt:on
 
@@ -999,13 +708,13 @@ def init_bold_preproc_trans_wf(
     use_fieldwarp : :obj:`bool`
         Include SDC warp in single-shot transform from BOLD to MNI
     interpolation : :obj:`str`
-        Interpolation type to be used by ANTs' ``applyTransforms``
-        (default ``"LanczosWindowedSinc"``)
+        Interpolation type, named after ANTs' ``applyTransforms`` options
+        (default ``"LanczosWindowedSinc"``, approximated by a cubic spline)
 
     Inputs
     ------
     bold_file
-        Individual 3D volumes, not motion corrected
+        BOLD series, not motion corrected
     name_source
         BOLD series NIfTI file
         Used to recover original information lost during processing
@@ -1020,10 +729,8 @@ def init_bold_preproc_trans_wf(
         BOLD series, resampled in native space, including all preprocessing
 
     """
-    from fmriprep.interfaces.maths import Clip
+    from fmriprep.interfaces.resampling import ResampleSeries
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
-    from niworkflows.interfaces.itk import MultiApplyTransforms
-    from niworkflows.interfaces.nilearn import Merge
 
     workflow = Workflow(name=name)
     workflow.__desc__ = """\
@@ -1060,33 +767,30 @@ the transforms to correct for head-motion"""
         mem_gb=DEFAULT_MEMORY_MIN_GB,
     )
 
+    # Interpolation can occasionally produce below-zero values as an artifact,
+    # which are clipped by the resampler
     bold_transform = pe.Node(
-        MultiApplyTransforms(interpolation=interpolation, copy_dtype=True),
+        ResampleSeries(
+            order=_SPLINE_ORDERS[interpolation],
+            clip=True,
+            copy_dtype=True,
+            compress=use_compression,
+            num_threads=omp_nthreads,
+        ),
         name="bold_transform",
-        mem_gb=mem_gb * 3 * omp_nthreads,
+        mem_gb=_resample_series_mem_gb(mem_gb, omp_nthreads),
         n_procs=omp_nthreads,
     )
 
-    # Interpolation can occasionally produce below-zero values as an artifact
-    threshold = pe.MapNode(
-        Clip(minimum=0),
-        name="threshold",
-        iterfield=['in_file'],
-        mem_gb=DEFAULT_MEMORY_MIN_GB)
-
-    merge = pe.Node(Merge(compress=use_compression), name="merge", mem_gb=mem_gb * 3)
-
     # fmt:off
     workflow.connect([
         (inputnode, merge_xforms, [("fieldwarp", "in1"),
                                    ("hmc_xforms", "in2")]),
         (inputnode, bold_transform, [("bold_file", "input_image"),
-                                     (("bold_file", _first), "reference_image")]),
-        (inputnode, merge, [("name_source", "header_source")]),
+                                     ("bold_file", "reference_image"),
+                                     ("name_source", "header_source")]),
         (merge_xforms, bold_transform, [("out", "transforms")]),
-        (bold_transform, threshold, [("out_files", "in_file")]),
-        (threshold, merge, [("out_file", "in_files")]),
-        (merge, outputnode, [("out_file", "bold")]),
+        (bold_transform, outputnode, [("out_file", "bold")]),
     ])
     # fmt:on
     return workflow
@@ -1142,7 +846,6 @@ def init_bold_grayords_wf(
         Density (i.e., either `91k` or `170k`) of ``cifti_bold``.
 
     """
-    import templateflow.api as tf
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.cifti import GenerateCifti
     from niworkflows.interfaces.utility import KeySelect
@@ -1202,8 +905,9 @@ surface space.
     )
     select_fs_surf.inputs.key = "fsaverage"
 
-    # Setup Workbench command. LR ordering for hemi can be assumed, as it is imposed
-    # by the iterfield of the MapNode in the surface sampling workflow above.
+    # Setup Workbench command. LR ordering for hemi can be assumed, as VolumeToSurface
+    # (the sampler of the surface sampling workflow above) writes its outputs in (lh, rh)
+    # order.
     resample = pe.MapNode(
         wb.MetricResample(method="ADAP_BARY_AREA", area_metrics=True),
         name="resample",
@@ -1217,54 +921,46 @@ surface space.
         ],
     )
     resample.inputs.current_sphere = [
-        str(
-            tf.get(
-                "fsaverage",
-                hemi=hemi,
-                density="164k",
-                desc="std",
-                suffix="sphere",
-                extension=".surf.gii",
-            )
+        _tf_get(
+            "fsaverage",
+            hemi=hemi,
+            density="164k",
+            desc="std",
+            suffix="sphere",
+            extension=".surf.gii",
         )
         for hemi in "LR"
     ]
     resample.inputs.current_area = [
-        str(
-            tf.get(
-                "fsaverage",
-                hemi=hemi,
-                density="164k",
-                desc="vaavg",
-                suffix="midthickness",
-                extension=".shape.gii",
-            )
+        _tf_get(
+            "fsaverage",
+            hemi=hemi,
+            density="164k",
+            desc="vaavg",
+            suffix="midthickness",
+            extension=".shape.gii",
         )
         for hemi in "LR"
     ]
     resample.inputs.new_sphere = [
-        str(
-            tf.get(
-                "fsLR",
-                space="fsaverage",
-                hemi=hemi,
-                density=fslr_density,
-                suffix="sphere",
-                extension=".surf.gii",
-            )
+        _tf_get(
+            "fsLR",
+            space="fsaverage",
+            hemi=hemi,
+            density=fslr_density,
+            suffix="sphere",
+            extension=".surf.gii",
         )
         for hemi in "LR"
     ]
     resample.inputs.new_area = [
-        str(
-            tf.get(
-                "fsLR",
-                hemi=hemi,
-                density=fslr_density,
-                desc="vaavg",
-                suffix="midthickness",
-                extension=".shape.gii",
-            )
+        _tf_get(
+            "fsLR",
+            hemi=hemi,
+            density=fslr_density,
+            desc="vaavg",
+            suffix="midthickness",
+            extension=".shape.gii",
         )
         for hemi in "LR"
     ]
@@ -1301,18 +997,28 @@ surface space.
     return workflow
 
 
-def _split_spec(in_target):
-    space, spec = in_target
-    template = space.split(":")[0]
-    return space, template, spec
+@lru_cache(maxsize=None)
+def _tf_get(template, **kwargs):
+    # TemplateFlow queries are repeated for every BOLD run, but resolve the same files
+    import templateflow.api as tf
+
+    return str(tf.get(template, **kwargs))
 
 
 def _select_template(template):
-    from niworkflows.utils.misc import get_template_specs
+    from fmriprep.workflows.bold.resampling import _template_file
 
     template, specs = template
     template = template.split(":")[0]  # Drop any cohort modifier if present
-    specs = specs.copy()
+    return _template_file(template, tuple(sorted(specs.items())))
+
+
+@lru_cache(maxsize=None)
+def _template_file(template, specs):
+    # Memoized, fallback included: every BOLD run looks up the same templates
+    from niworkflows.utils.misc import get_template_specs
+
+    specs = dict(specs)
     specs["suffix"] = specs.get("suffix", "T1w")
 
     # Sanitize resolution
@@ -1332,10 +1038,48 @@ def _select_template(template):
     return out[0]
 
 
+def _select_interpolation(reference, moving):
+    # Spline interpolation only pays off when upsampling: resample linearly
+    # when the output voxels are at least 90% the size of the input ones
+    import nibabel as nb
+    import numpy as np
+
+    ratio = np.divide(
+        nb.load(reference).header.get_zooms()[:3], nb.load(moving).header.get_zooms()[:3]
+    )
+    return 1 if np.all(ratio >= 0.9) else 3
+
+
+def _resample_series_mem_gb(mem_gb, omp_nthreads, grid_ratio=1.0):
+    """
+    Estimate the memory (in GB) of resampling a BOLD series with ``ResampleSeries``.
+
+    ``mem_gb`` is four times the on-disk size of the series, and three times ``mem_gb``
+    cover the input series (decompressed at once when gzipped) and the spline-filtered
+    volumes. The whole resampled series is also held in memory, in single precision:
+    about ``mem_gb`` times ``grid_ratio``, the ratio of the number of voxels of the
+    reference grid to that of the input. Each thread adds its own copies of the mapped
+    grid coordinates (``3 x N`` single precision values), taken as a tenth of the
+    resampled series.
+
+    >>> _resample_series_mem_gb(1.0, 1)
+    4.1
+    >>> _resample_series_mem_gb(1.0, 8, grid_ratio=4.0)
+    10.2
+
+    """
+    output_gb = mem_gb * grid_ratio
+    return round(mem_gb * 3 + output_gb * (1 + 0.1 * omp_nthreads), 2)
+
+
 def _first(inlist):
     return inlist[0]
 
 
+def _last(inlist):
+    return inlist[-1]
+
+
 def _aslist(in_value):
     if isinstance(in_value, list):
         return in_value
@@ -1346,17 +1090,30 @@ def _is_native(in_value):
     return in_value.get("resolution") == "native" or in_value.get("res") == "native"
 
 
-def _itk2lta(in_file, src_file, dst_file):
-    import nitransforms as nt
-    from pathlib import Path
-
-    out_file = Path("out.lta").absolute()
-    nt.linear.load(
-        in_file, fmt="fs" if in_file.endswith(".lta") else "itk", reference=src_file
-    ).to_filename(out_file, moving=dst_file, fmt="fs")
-    return str(out_file)
-
-
 def _sorted_by_basename(inlist):
     from os.path import basename
     return sorted(inlist, key=lambda x: str(basename(x)))
+
+
+def _sorted_wm_pial(inlist):
+    # Sort each (white, pial) pair of surfaces by hemisphere, keeping white first
+    from fmriprep.workflows.bold.resampling import _sorted_by_basename
+    return _sorted_by_basename(inlist[:2]) + _sorted_by_basename(inlist[2:4])
+
+
+def _sorted_wm(inlist):
+    from fmriprep.workflows.bold.resampling import _sorted_by_basename
+    return _sorted_by_basename(inlist[:2])
+
+
+def _sorted_pial(inlist):
+    from fmriprep.workflows.bold.resampling import _sorted_by_basename
+    return _sorted_by_basename(inlist[2:4])
+
+
+def _wm_pair(inlist):
+    return inlist[:2]
+
+
+def _pial_pair(inlist):
+    return inlist[2:4]
@@ -0,0 +1,80 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2022 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+''' Testing module for fmriprep.workflows.bold.resampling '''
+import nibabel as nb
+import numpy as np
+from nipype.pipeline import engine as pe
+from nipype.pipeline.engine.utils import evaluate_connect_function
+from niworkflows.utils.spaces import SpatialReferences
+
+from ..confounds import init_ica_aroma_wf
+from ..resampling import init_bold_std_trans_wf
+
+
+def test_std_trans_wf_to_aroma(tmp_path):
+    spaces = SpatialReferences(
+        spaces=[("MNI152NLin6Asym", {"res": "2"})], checkpoint=True
+    )
+    bold_std_trans_wf = init_bold_std_trans_wf(
+        freesurfer=False, mem_gb=1, omp_nthreads=1, spaces=spaces, multiecho=False
+    )
+    ica_aroma_wf = init_ica_aroma_wf(
+        mem_gb=1, metadata={"RepetitionTime": 2.0}, omp_nthreads=1
+    )
+    workflow = pe.Workflow(name="test_wf")
+    workflow.connect([
+        (bold_std_trans_wf, ica_aroma_wf, [
+            ("outputnode.bold_std", "inputnode.bold_std"),
+            ("outputnode.bold_mask_std", "inputnode.bold_mask_std"),
+            ("outputnode.spatial_reference", "inputnode.spatial_reference"),
+        ]),
+    ])
+    workflow._create_flat_graph()
+
+    # Run the mask resampling, and pass its outputs down to ICA-AROMA
+    mask_file = str(tmp_path / "mask.nii.gz")
+    nb.Nifti1Image(np.ones((4, 4, 4), dtype=np.uint8), np.eye(4)).to_filename(mask_file)
+    mask_std_tfm = bold_std_trans_wf.get_node("mask_std_tfm")
+    mask_std_tfm.base_dir = str(tmp_path)
+    mask_std_tfm.inputs.in_files = mask_file
+    mask_std_tfm.inputs.transforms = ["identity"]
+    mask_std_tfm.inputs.reference_image = mask_file
+    out_files = mask_std_tfm.run().outputs.out_files
+
+    ((source, func, args), field), = bold_std_trans_wf._graph.get_edge_data(
+        mask_std_tfm, bold_std_trans_wf.get_node("poutputnode")
+    )["connect"]
+    assert (source, field) == ("out_files", "bold_mask_std")
+    bold_mask_std = evaluate_connect_function(func, args, out_files)
+
+    select_std = ica_aroma_wf.get_node("select_std")
+    select_std.inputs.keys = ["MNI152NLin6Asym_res-2"]
+    select_std.inputs.bold_std = [mask_file]
+    select_std.inputs.bold_mask_std = [bold_mask_std]  # Joined over templates
+    selected = select_std.interface.run().outputs.bold_mask_std
+
+    # These take a single file, and would raise a TraitError for a list
+    ica_aroma_wf.get_node("calc_median_val").inputs.mask_file = selected
+    ica_aroma_wf.get_node("melodic").inputs.mask = selected
+    ica_aroma_wf.get_node("ica_aroma").inputs.mask = selected
+    ica_aroma_wf.get_node("ica_aroma").inputs.report_mask = selected